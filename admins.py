@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+
+
+class ChatAdminCache:
+    def __init__(self, bot, ttl: float = 600, failure_ttl: float = 30):
+        self.bot = bot
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._admins = {}
+        self._locks = {}
+
+    async def is_admin(self, user_id: int, chat_id: int) -> bool:
+        return user_id in await self.get_admins(chat_id)
+
+    async def get_admins(self, chat_id: int) -> frozenset:
+        entry = self._admins.get(chat_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            entry = self._admins.get(chat_id)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            try:
+                members = await self.bot.get_chat_administrators(chat_id)
+            except Exception as e:
+                logging.error("Error fetching administrators of chat %s: %s", chat_id, e)
+                # The fallback is cached too, so a failing chat is not retried on every vote.
+                retry_in = e.retry_after if isinstance(e, TelegramRetryAfter) else self.failure_ttl
+                admins = entry[1] if entry else frozenset()
+                self._admins[chat_id] = (time.monotonic() + retry_in, admins)
+                return admins
+            admins = frozenset(member.user.id for member in members)
+            self._admins[chat_id] = (time.monotonic() + self.ttl, admins)
+            return admins
+
+    def invalidate(self, chat_id: int):
+        self._admins.pop(chat_id, None)
@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, GetChatAdministrators, GetChatMember
+from aiogram.types import (CallbackQuery, Chat, ChatMemberAdministrator, ChatMemberMember, Message, Update, User)
+
+BOT_ID = 1000
+FAKE_TOKEN = f"{BOT_ID}:BENCHMARK"
+SUPER_ADMIN = 1
+ADMIN_IDS = range(1, 51)
+SEED = 1234
+
+
+class FakeSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+        self._admins = None
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, GetChatAdministrators):
+            if self._admins is None:
+                self._admins = [ChatMemberAdministrator(
+                    user=make_user(user_id), status='administrator', can_be_edited=False, is_anonymous=False,
+                    can_manage_chat=True, can_delete_messages=True, can_manage_video_chats=True,
+                    can_restrict_members=True, can_promote_members=True, can_change_info=True,
+                    can_invite_users=True, can_post_stories=True, can_edit_stories=True, can_delete_stories=True,
+                ) for user_id in ADMIN_IDS]
+            return self._admins
+        if isinstance(method, GetChatMember):
+            return ChatMemberMember(user=make_user(method.user_id), status='member')
+        if isinstance(method, AnswerCallbackQuery):
+            return True
+        chat_id = getattr(method, 'chat_id', 0) or 0
+        return Message(message_id=1, date=datetime.now(), chat=Chat(id=chat_id, type='supergroup'),
+                       from_user=make_user(BOT_ID, is_bot=True), text=getattr(method, 'text', None))
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def install_fake_session(bot) -> FakeSession:
+    session = FakeSession()
+    # Keep request middlewares (metrics) registered on the real session.
+    session.middleware = bot.session.middleware
+    bot.session = session
+    return session
+
+
+def make_user(user_id: int, is_bot: bool = False) -> User:
+    return User(id=user_id, is_bot=is_bot, first_name=f"User {user_id}")
+
+
+def make_chat(chat_id: int) -> Chat:
+    if chat_id > 0:
+        return Chat(id=chat_id, type='private', first_name=f"User {chat_id}")
+    return Chat(id=chat_id, type='supergroup', title=f"Chat {chat_id}")
+
+
+def make_update(update_id: int, chat_id: int, user_id: int, text: str, reply_to_user_id: int = None,
+                reply_message_id: int = None) -> Update:
+    chat = make_chat(chat_id)
+    reply_to = None
+    if reply_to_user_id is not None:
+        reply_to = Message(message_id=reply_message_id or update_id * 2, date=datetime.now(), chat=chat,
+                           from_user=make_user(reply_to_user_id), text="hello")
+    message = Message(message_id=update_id * 2 + 1, date=datetime.now(), chat=chat,
+                      from_user=make_user(user_id), text=text, reply_to_message=reply_to)
+    return Update(update_id=update_id, message=message)
+
+
+def make_callback(update_id: int, chat_id: int, user_id: int, data: str) -> Update:
+    message = Message(message_id=update_id * 2, date=datetime.now(), chat=make_chat(chat_id),
+                      from_user=make_user(BOT_ID, is_bot=True), text="...")
+    query = CallbackQuery(id=str(update_id), from_user=make_user(user_id), chat_instance=str(chat_id),
+                          data=data, message=message)
+    return Update(update_id=update_id, callback_query=query)
+
+
+def chat_ids(chats: int):
+    return [-100 - i for i in range(chats)]
+
+
+def non_vote_updates(count: int, chats: int, rng: random.Random):
+    for i in range(count):
+        yield make_update(i, -100 - i % chats, 10 + i % 50, f"just chatting {i}",
+                          reply_to_user_id=11 if i % 3 == 0 else None)
+
+
+def vote_storm_updates(count: int, chats: int, rng: random.Random):
+    for i in range(count):
+        giver = ADMIN_IDS[i % len(ADMIN_IDS)]
+        yield make_update(i, -100 - i % chats, giver, "-1" if i % 4 == 3 else "+1",
+                          reply_to_user_id=100 + rng.randrange(500))
+
+
+def vote_spam_updates(count: int, chats: int, rng: random.Random):
+    # A few admins hammering the same replies: almost everything should be rejected by the throttle.
+    for i in range(count):
+        yield make_update(i, -100 - i % chats, ADMIN_IDS[i % 3], "+1", reply_to_user_id=100 + i % 5,
+                          reply_message_id=1 + i % 5)
+
+
+def many_chats_updates(count: int, chats: int, rng: random.Random):
+    for i in range(count):
+        chat_id = -100 - rng.randrange(chats)
+        if i % 5 == 0:
+            yield make_update(i, chat_id, ADMIN_IDS[i % len(ADMIN_IDS)], "+1", reply_to_user_id=100 + rng.randrange(500))
+        else:
+            yield make_update(i, chat_id, 100 + rng.randrange(500), f"message {i}")
+
+
+def top_flood_updates(count: int, chats: int, rng: random.Random):
+    for i in range(count):
+        chat_id = -100 - i % chats
+        user_id = 100 + rng.randrange(500)
+        kind = i % 4
+        if kind == 0:
+            yield make_update(i, chat_id, user_id, "/top")
+        elif kind == 1:
+            yield make_update(i, chat_id, user_id, "/top 50")
+        elif kind == 2:
+            yield make_callback(i, chat_id, user_id, f"top_page:{rng.randrange(0, 4000, 10)}:10")
+        else:
+            yield make_update(i, chat_id, user_id, "/mystats")
+
+
+def chart_updates(count: int, chats: int, rng: random.Random):
+    # Every tenth update is a vote, so cached charts keep getting invalidated.
+    for i in range(count):
+        chat_id = -100 - rng.randrange(chats)
+        if i % 10 == 9:
+            yield make_update(i, chat_id, ADMIN_IDS[i % len(ADMIN_IDS)], "+1", reply_to_user_id=100 + rng.randrange(500))
+        else:
+            yield make_callback(i, SUPER_ADMIN, SUPER_ADMIN, f"select_chat_activity_graph:{chat_id}")
+
+
+def replay_updates(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def seed_activity(conn: sqlite3.Connection, chats: int, rows: int, rng: random.Random):
+    now = datetime.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+    span = max(now.timestamp() - month_start, 1)
+    ids = chat_ids(chats)
+    batch = []
+    for _ in range(rows):
+        timestamp = datetime.fromtimestamp(month_start + rng.random() * span, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        batch.append((rng.choice(ids), ADMIN_IDS[rng.randrange(len(ADMIN_IDS))], 100 + rng.randrange(500),
+                      1 if rng.random() < 0.75 else -1, timestamp))
+        if len(batch) == 10000:
+            conn.executemany('INSERT INTO activity_log (chat_id, giver_id, receiver_id, score_change, timestamp) '
+                             'VALUES (?, ?, ?, ?, ?)', batch)
+            batch.clear()
+    conn.executemany('INSERT INTO activity_log (chat_id, giver_id, receiver_id, score_change, timestamp) '
+                     'VALUES (?, ?, ?, ?, ?)', batch)
+
+
+def seed_users(conn: sqlite3.Connection, chats: int, rows: int, rng: random.Random):
+    month = datetime.now().strftime('%Y-%m')
+    per_chat = max(rows // chats, 1)
+    conn.executemany(
+        'INSERT INTO users (user_id, chat_id, score, last_activity_month) VALUES (?, ?, ?, ?)',
+        ((100 + n, chat_id, rng.randrange(-20, 200), month) for chat_id in chat_ids(chats) for n in range(per_chat))
+    )
+
+
+# name: (update generator, default updates, default chats, seeding function, default seed rows)
+SCENARIOS = {
+    'non_vote': (non_vote_updates, 5000, 20, None, 0),
+    'vote_storm': (vote_storm_updates, 5000, 20, None, 0),
+    'vote_spam': (vote_spam_updates, 5000, 5, None, 0),
+    'many_chats': (many_chats_updates, 20000, 10000, None, 0),
+    'big_activity_log': (vote_storm_updates, 5000, 20, seed_activity, 500000),
+    'top_flood': (top_flood_updates, 2000, 5, seed_users, 25000),
+    'charts': (chart_updates, 200, 5, seed_activity, 20000),
+    'replay': (None, 0, 0, None, 0),
+}
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def database_size(path: str) -> int:
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def cold_import_time() -> float:
+    # A fresh interpreter, as on a restart: aiogram's models are built again and nothing is cached.
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import main'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                   capture_output=True, check=True)
+    return time.perf_counter() - started
+
+
+async def run_scenario(args) -> dict:
+    import main
+
+    generate, _, _, seed, _ = SCENARIOS[args.scenario]
+    rng = random.Random(SEED)
+    session = install_fake_session(main.bot)
+    started = time.perf_counter()
+    await main.dp.emit_startup(bot=main.bot)
+    startup = time.perf_counter() - started
+    if seed and args.seed_rows:
+        conn = sqlite3.connect(main.DB_NAME)
+        with conn:
+            seed(conn, args.chats, args.seed_rows, rng)
+        conn.close()
+        await main.db.rebuild_daily_rollup()
+
+    # Updates are fed as raw JSON-like dicts, so parsing is timed once, as with polling or webhooks.
+    if args.scenario == 'replay':
+        updates = list(replay_updates(args.file))
+    else:
+        updates = [update.model_dump(mode='json', exclude_none=True) for update in generate(args.updates, args.chats, rng)]
+
+    latencies = []
+    started = time.perf_counter()
+    for update in updates:
+        t0 = time.perf_counter()
+        await main.dp.feed_raw_update(main.bot, update)
+        latencies.append(time.perf_counter() - t0)
+    # Write-behind buffers are part of the cost of the run.
+    await main.db.flush()
+    elapsed = time.perf_counter() - started
+    await main.dp.emit_shutdown(bot=main.bot)
+
+    return {
+        'scenario': args.scenario,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'updates': len(updates),
+        'chats': args.chats,
+        'seed_rows': args.seed_rows if seed else 0,
+        'cold_import_ms': round(args.cold_import * 1e3, 1),
+        'startup_ms': round(startup * 1e3, 1),
+        'first_update_us': round(latencies[0] * 1e6, 1) if latencies else None,
+        'elapsed_sec': round(elapsed, 3),
+        'updates_per_sec': round(len(updates) / elapsed, 1),
+        'mean_us': round(statistics.mean(latencies) * 1e6, 1),
+        'p50_us': round(percentile(latencies, 0.50) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 0.99) * 1e6, 1),
+        'max_us': round(max(latencies) * 1e6, 1),
+        'db_size_bytes': database_size(main.DB_NAME),
+        'bot_api_calls': dict(session.calls),
+    }
+
+
+def print_result(result: dict, baseline: dict = None):
+    for key, value in result.items():
+        line = f"{key + ':':<17}{value}"
+        if baseline and isinstance(value, (int, float)) and isinstance(baseline.get(key), (int, float)) and baseline[key]:
+            line += f"  ({(value - baseline[key]) / baseline[key] * 100:+.1f}% vs {baseline.get('commit') or 'baseline'})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feed synthetic or recorded updates through the dispatcher against a fake Bot API session.")
+    parser.add_argument('scenario', choices=list(SCENARIOS))
+    parser.add_argument('--updates', type=int, help="Number of updates (default depends on the scenario)")
+    parser.add_argument('--chats', type=int, help="Number of group chats (default depends on the scenario)")
+    parser.add_argument('--seed-rows', type=int, help="Rows preloaded into the database (default depends on the scenario)")
+    parser.add_argument('--file', help="Recorded updates, one JSON object per line (replay only)")
+    parser.add_argument('--json', help="Write the result to this file")
+    parser.add_argument('--compare', help="Print relative changes against a result saved with --json")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    if args.scenario == 'replay' and not args.file:
+        parser.error("replay needs --file")
+
+    _, updates, chats, _, seed_rows = SCENARIOS[args.scenario]
+    args.updates = updates if args.updates is None else args.updates
+    args.chats = chats if args.chats is None else args.chats
+    args.seed_rows = seed_rows if args.seed_rows is None else args.seed_rows
+
+    workdir = tempfile.mkdtemp(prefix='karma-bench-')
+    os.environ['BOT_TOKEN'] = FAKE_TOKEN
+    os.environ['SUPER_ADMIN_ID'] = str(SUPER_ADMIN)
+    os.environ['DB_NAME'] = os.path.join(workdir, 'bench.db')
+    os.environ['ACTIVITY_ARCHIVE_DIR'] = os.path.join(workdir, 'archive')
+    if args.scenario != 'vote_spam':
+        # Storms come from many admins on distinct replies; the throttle is measured by vote_spam.
+        for name in ('VOTE_GIVER_COOLDOWN', 'VOTE_RECEIVER_COOLDOWN', 'VOTE_DAILY_CAP'):
+            os.environ.setdefault(name, '0')
+    os.environ.setdefault('METRICS_PORT', '0')
+    args.cold_import = cold_import_time()
+    import main as bot_main  # noqa: F401  configures logging on import
+    logging.getLogger().setLevel(args.log_level)
+
+    result = asyncio.run(run_scenario(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_result(result, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+from leaderboard import ChatLeaderboard
+from outbox import Outbox, TokenBucket, VoteConfirmation
+from throttle import VotePolicy, VoteThrottle
+
+CHAT = -1001
+T0 = 1_700_000_000.0
+
+
+def make_throttle(giver_cooldown=0, receiver_cooldown=0, daily_cap=0, capacity=100000) -> VoteThrottle:
+    return VoteThrottle(None, VotePolicy(giver_cooldown, receiver_cooldown, daily_cap), capacity)
+
+
+def check_throttle():
+    throttle = make_throttle()
+    assert throttle.acquire(CHAT, 1, 10, 20, now=T0) is None
+    assert throttle.acquire(CHAT, 1, 10, 20, now=T0 + 1) == 'duplicate'
+    assert throttle.acquire(CHAT, 1, 11, 20, now=T0 + 1) is None
+    assert len(throttle._unsaved) == 2
+
+    throttle = make_throttle(giver_cooldown=10, receiver_cooldown=60)
+    assert throttle.acquire(CHAT, 1, 10, 20, now=T0) is None
+    assert throttle.acquire(CHAT, 2, 10, 21, now=T0 + 5) == 'giver_cooldown'
+    assert throttle.acquire(CHAT, 3, 10, 21, now=T0 + 10) is None
+    assert throttle.acquire(CHAT, 4, 10, 20, now=T0 + 30) == 'receiver_cooldown'
+    assert throttle.acquire(CHAT, 5, 10, 20, now=T0 + 60) is None
+    # Cooldowns are per chat.
+    assert throttle.acquire(CHAT - 1, 6, 10, 20, now=T0 + 61) is None
+
+    throttle = make_throttle(daily_cap=2)
+    assert throttle.acquire(CHAT, 1, 10, 20, now=T0) is None
+    assert throttle.acquire(CHAT, 2, 10, 21, now=T0 + 1) is None
+    assert throttle.acquire(CHAT, 3, 10, 22, now=T0 + 2) == 'daily_cap'
+    assert throttle.acquire(CHAT, 4, 10, 22, now=T0 + throttle.WINDOW - 1) == 'daily_cap'
+    # The cap is a sliding 24-hour window; a vote stops counting once it is more than a day old.
+    assert throttle.acquire(CHAT, 5, 10, 22, now=T0 + throttle.WINDOW) == 'daily_cap'
+    assert throttle.acquire(CHAT, 6, 10, 22, now=T0 + throttle.WINDOW + 0.5) is None
+    assert throttle.acquire(CHAT, 7, 10, 23, now=T0 + throttle.WINDOW + 0.7) == 'daily_cap'
+
+    throttle = make_throttle()
+    throttle.policies[CHAT] = VotePolicy(daily_cap=1)
+    assert throttle.acquire(CHAT, 1, 10, 20, now=T0) is None
+    assert throttle.acquire(CHAT, 2, 10, 21, now=T0 + 1) == 'daily_cap'
+    assert throttle.acquire(CHAT - 1, 3, 10, 21, now=T0 + 1) is None
+
+    throttle = make_throttle(capacity=2)
+    for message_id in (1, 2, 3):
+        assert throttle.acquire(CHAT, message_id, 10 + message_id, 20, now=T0 + message_id) is None
+    assert len(throttle._messages) == 2
+    # The oldest mark was evicted, so its message is no longer recognised as a duplicate.
+    assert throttle.check(CHAT, 1, 11, 20, now=T0 + 4) is None
+    assert throttle.check(CHAT, 3, 13, 20, now=T0 + 4) == 'duplicate'
+
+    throttle = make_throttle(giver_cooldown=10)
+    assert throttle.acquire(CHAT, 1, 10, 20, now=T0) is None
+    throttle.check(CHAT, 2, 11, 21, now=T0 + throttle.WINDOW + 1)
+    assert not throttle._messages and not throttle._givers and not throttle._pairs
+
+
+def check_leaderboard():
+    board = ChatLeaderboard([(1, 5), (2, 7), (3, 5), (4, -1)])
+    assert board.top(10) == [(2, 7), (1, 5), (3, 5), (4, -1)]
+    assert [board.rank(user_id) for user_id in (2, 1, 3, 4)] == [1, 2, 3, 4]
+    assert board.rank(99) is None and board.score(99) == 0
+
+    board.update(4, 9)
+    assert board.top(2) == [(4, 9), (2, 7)]
+    assert board.top(2, offset=2) == [(1, 5), (3, 5)]
+    board.update(5, 6)
+    assert board.rank(5) == 3 and len(board) == 5
+
+    board.remove(2)
+    board.remove(2)
+    assert len(board) == 4 and board.rank(5) == 2
+
+    board.reset()
+    assert board.top(10) == [(1, 0), (3, 0), (4, 0), (5, 0)]
+    assert board.score(4) == 0 and board.rank(4) == 3
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def send_message(self, chat_id, text, reply_parameters=None):
+        self.calls.append(('send', chat_id, text))
+        return SimpleNamespace(message_id=len(self.calls))
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.calls.append(('edit', chat_id, text))
+
+
+async def check_outbox():
+    bucket = TokenBucket(rate=2, capacity=3)
+    bucket.tokens, bucket.updated = 0, 100.0
+    bucket._refill(101.0)
+    assert bucket.tokens == 2
+    bucket._refill(110.0)
+    assert bucket.tokens == 3
+
+    confirmation = VoteConfirmation(CHAT, 1, "Вася")
+    confirmation.add(10, 1, 4)
+    assert confirmation.text() == "Баллы пользователя Вася изменены. Текущие баллы: 4"
+    confirmation.add(11, 1, 5)
+    assert confirmation.text() == "Баллы пользователя Вася: +2 от 2 админов, теперь 5"
+    assert confirmation.take_text() and not confirmation.dirty
+
+    bot = FakeBot()
+    outbox = Outbox(bot, coalesce_window=60)
+    # Votes queued before the first send are folded into one message, later ones edit it.
+    outbox.confirm_vote(CHAT, 1, 20, "Вася", 10, 1, 1)
+    outbox.confirm_vote(CHAT, 2, 20, "Вася", 11, 1, 2)
+    await asyncio.sleep(0)
+    outbox.confirm_vote(CHAT, 3, 20, "Вася", 12, -1, 1)
+    await outbox.close()
+    assert bot.calls == [
+        ('send', CHAT, "Баллы пользователя Вася: +2 от 2 админов, теперь 2"),
+        ('edit', CHAT, "Баллы пользователя Вася: +1 от 3 админов, теперь 1"),
+    ]
+
+
+def main():
+    check_throttle()
+    check_leaderboard()
+    asyncio.run(check_outbox())
+    print("Throttle, leaderboard and outbox checks passed.")
+
+
+if __name__ == "__main__":
+    main()
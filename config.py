@@ -1,5 +1,56 @@
 import os
+import socket
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 SUPER_ADMIN_ID = int(os.getenv("SUPER_ADMIN_ID", "6863047743"))
-DB_NAME = 'karma_bot.db'
\ No newline at end of file
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite")
+DB_NAME = os.getenv("DB_NAME", 'karma_bot.db')
+DB_READ_WORKERS = int(os.getenv("DB_READ_WORKERS", "4"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16000"))
+WRITE_FLUSH_INTERVAL_MS = int(os.getenv("WRITE_FLUSH_INTERVAL_MS", "200"))
+WRITE_FLUSH_MAX_ROWS = int(os.getenv("WRITE_FLUSH_MAX_ROWS", "500"))
+ADMIN_CACHE_TTL = int(os.getenv("ADMIN_CACHE_TTL", "600"))
+ADMIN_CACHE_FAILURE_TTL = int(os.getenv("ADMIN_CACHE_FAILURE_TTL", "30"))
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "10000"))
+NAME_LOOKUP_CONCURRENCY = int(os.getenv("NAME_LOOKUP_CONCURRENCY", "5"))
+OUTBOX_CHAT_RATE_PER_MINUTE = float(os.getenv("OUTBOX_CHAT_RATE_PER_MINUTE", "20"))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+VOTE_COALESCE_SECONDS = float(os.getenv("VOTE_COALESCE_SECONDS", "10"))
+VOTE_GIVER_COOLDOWN = float(os.getenv("VOTE_GIVER_COOLDOWN", "1"))
+VOTE_RECEIVER_COOLDOWN = float(os.getenv("VOTE_RECEIVER_COOLDOWN", "10"))
+VOTE_DAILY_CAP = int(os.getenv("VOTE_DAILY_CAP", "200"))
+VOTE_THROTTLE_CAPACITY = int(os.getenv("VOTE_THROTTLE_CAPACITY", "100000"))
+VOTE_THROTTLE_PERSIST_SECONDS = int(os.getenv("VOTE_THROTTLE_PERSIST_SECONDS", "30"))
+TOP_PAGE_SIZE = int(os.getenv("TOP_PAGE_SIZE", "10"))
+TOP_MAX_LIMIT = int(os.getenv("TOP_MAX_LIMIT", "50"))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "10"))
+DASHBOARD_DAYS = int(os.getenv("DASHBOARD_DAYS", "30"))
+DASHBOARD_TOP_GIVERS = int(os.getenv("DASHBOARD_TOP_GIVERS", "10"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", "90"))
+ACTIVITY_ARCHIVE_DIR = os.getenv("ACTIVITY_ARCHIVE_DIR", "archive")
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "5000"))
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WORKERS = int(os.getenv("WORKERS", "1"))
+WORKER_PENDING_UPDATES = int(os.getenv("WORKER_PENDING_UPDATES", "1000"))
+SHARED_STATE = os.getenv("SHARED_STATE", "0") == "1"
+FSM_STORAGE = os.getenv("FSM_STORAGE", "database")
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEADER_LEASE_TTL = int(os.getenv("LEADER_LEASE_TTL", "30"))
+SHARED_STATE_SYNC_SECONDS = int(os.getenv("SHARED_STATE_SYNC_SECONDS", "2"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost/karma_bot")
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
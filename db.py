@@ -1,135 +1,244 @@
+import asyncio
+import os
+import re
 import sqlite3
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import logging
 
-class Database:
-    def __init__(self, db_name):
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
-        self._create_tables()
-
-    def _create_tables(self):
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER NOT NULL,
-                chat_id INTEGER NOT NULL,
-                score INTEGER DEFAULT 0,
-                last_activity_month TEXT,
-                PRIMARY KEY (user_id, chat_id)
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admins (
-                user_id INTEGER NOT NULL,
-                chat_id INTEGER NOT NULL,
-                PRIMARY KEY (user_id, chat_id)
-            )
-        ''')
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chats (
-                chat_id INTEGER PRIMARY KEY,
-                chat_name TEXT,
-                chat_type TEXT
-            )
-        """)
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS activity_log (
-                chat_id INTEGER,
-                giver_id INTEGER,
-                receiver_id INTEGER,
-                score_change INTEGER,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        self.conn.commit()
-
-    def add_chat(self, chat_id: int, chat_name: str, chat_type: str):
+from migrations import migrate, rebuild_daily_rollup
+from storage import Storage
+
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -16000,
+}
+
+class Database(Storage):
+    def __init__(self, db_name, read_workers: int = 4, busy_timeout: float = 5.0, pragmas: dict = None, **options):
+        super().__init__(**options)
+        self.db_name = db_name
+        self.busy_timeout = busy_timeout
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # All writes go through a single thread so they never contend for the
+        # SQLite write lock inside this process; reads run in parallel on WAL snapshots.
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix='db-reader')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout, check_same_thread=False)
+            # Takes effect only on a brand-new file, before WAL mode writes its header; existing
+            # databases are converted by enable_incremental_vacuum(), which needs a full VACUUM.
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+            # With WAL, synchronous=NORMAL only syncs at checkpoints; a crash cannot corrupt the file.
+            for name, value in self.pragmas.items():
+                conn.execute(f'PRAGMA {name} = {value}')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _run_write(self, func, args):
+        conn = self._connection()
+        cursor = conn.cursor()
+        # The savepoint keeps a failed statement from rolling back deferred writes queued before it.
+        cursor.execute('SAVEPOINT write')
         try:
-            self.cursor.execute('INSERT INTO chats (chat_id, chat_name, chat_type) VALUES (?, ?, ?)',
-                                (chat_id, chat_name, chat_type))
-            self.conn.commit()
-            logging.info(f"Added chat: {chat_name} (ID: {chat_id})")
-        except sqlite3.IntegrityError:
-            pass
-
-    def get_chats(self):
-        self.cursor.execute('SELECT chat_id, chat_name FROM chats')
-        return self.cursor.fetchall() 
-
-    async def get_user_score(self, user_id: int, chat_id: int) -> int:
-        self.cursor.execute('SELECT score FROM users WHERE user_id = ? AND chat_id = ?', (user_id, chat_id))
-        result = self.cursor.fetchone()
-        return result[0] if result else 0
-
-    async def update_user_score(self, user_id: int, chat_id: int, change: int):
-        current_month = datetime.now().strftime('%Y-%m')
-        self.cursor.execute('''
-            INSERT INTO users (user_id, chat_id, score, last_activity_month)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id, chat_id) DO UPDATE SET
-                score = score + ?,
-                last_activity_month = ?
-        ''', (user_id, chat_id, change, current_month, change, current_month))
-        self.conn.commit()
-
-    async def add_admin(self, user_id: int, chat_id: int):
-        self.cursor.execute('INSERT OR IGNORE INTO admins (user_id, chat_id) VALUES (?, ?)', (user_id, chat_id))
-        self.conn.commit()
-
-    async def remove_admin(self, user_id: int, chat_id: int):
-        self.cursor.execute('DELETE FROM admins WHERE user_id = ? AND chat_id = ?', (user_id, chat_id))
-        self.conn.commit()
-
-    async def is_admin(self, user_id: int, chat_id: int) -> bool:
-        self.cursor.execute('SELECT 1 FROM admins WHERE user_id = ? AND chat_id = ?', (user_id, chat_id))
-        return self.cursor.fetchone() is not None
-
-    async def get_chat_admins(self, chat_id: int) -> list:
-        self.cursor.execute('SELECT user_id FROM admins WHERE chat_id = ?', (chat_id,))
-        return [row[0] for row in self.cursor.fetchall()]
-
-    async def get_top_users(self, chat_id: int, limit: int = 10) -> list:
-        self.cursor.execute(
-            'SELECT user_id, score FROM users WHERE chat_id = ? ORDER BY score DESC LIMIT ?',
-            (chat_id, limit)
-        )
-        return self.cursor.fetchall()
-
-    async def log_activity(self, chat_id: int, giver_id: int, receiver_id: int, score_change: int):
-        self.cursor.execute(
-            'INSERT INTO activity_log (chat_id, giver_id, receiver_id, score_change) VALUES (?, ?, ?, ?)',
-            (chat_id, giver_id, receiver_id, score_change)
-        )
-        self.conn.commit()
-
-    async def get_monthly_activity(self, chat_id: int, year: int, month: int):
-        start_date = datetime(year, month, 1).strftime('%Y-%m-%d %H:%M:%S')
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1).strftime('%Y-%m-%d %H:%M:%S')
+            result = func(cursor, *args)
+        except Exception:
+            cursor.execute('ROLLBACK TO write')
+            cursor.execute('RELEASE write')
+            raise
         else:
-            end_date = datetime(year, month + 1, 1).strftime('%Y-%m-%d %H:%M:%S')
-
-        self.cursor.execute(
-            '''
-            SELECT strftime('%Y-%m-%d', timestamp) as day, SUM(score_change)
-            FROM activity_log
-            WHERE chat_id = ? AND timestamp >= ? AND timestamp < ?
-            GROUP BY day
-            ORDER BY day
-            ''',
-            (chat_id, start_date, end_date)
+            cursor.execute('RELEASE write')
+            conn.commit()
+            return result
+        finally:
+            cursor.close()
+
+    def _run_deferred(self, func, args):
+        if self.shared:
+            # Other processes write to the same file; holding the write lock until the next flush would stall them.
+            return self._run_write(func, args)
+        cursor = self._connection().cursor()
+        try:
+            return func(cursor, *args)
+        finally:
+            cursor.close()
+
+    def _run_maintenance(self, func, args):
+        # Commits any deferred writes first: ATTACH and VACUUM cannot run inside a transaction.
+        conn = self._connection()
+        conn.commit()
+        return func(conn, *args)
+
+    def _run_read(self, func, args):
+        cursor = self._connection().cursor()
+        try:
+            return func(cursor, *args)
+        finally:
+            cursor.close()
+
+    async def _write(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._run_write, func, args)
+
+    async def _write_deferred(self, func, *args):
+        # Runs inside the writer's open transaction; it becomes durable with the next flush() or _write().
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._writer, self._run_deferred, func, args)
+        self._schedule_flush()
+        return result
+
+    async def _maintain(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._run_maintenance, func, args)
+
+    async def _read_latest(self, func, *args):
+        # Reads on the writer connection, so deferred writes that are not yet committed are visible.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._run_read, func, args)
+
+    async def _read(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_read, func, args)
+
+    async def _execute(self, query: str, params: tuple = ()) -> int:
+        return await self._write(lambda cursor: cursor.execute(query, params).rowcount)
+
+    async def _transaction_returning(self, statements):
+        def run(cursor):
+            for query, params in statements:
+                cursor.execute(query, params)
+            return cursor.fetchone()
+        return await self._write_deferred(run)
+
+    async def _transaction(self, statements) -> list:
+        return await self._write(lambda cursor: [cursor.execute(query, params).rowcount for query, params in statements])
+
+    async def _executemany(self, batches):
+        def run(cursor):
+            for query, rows in batches:
+                if rows:
+                    cursor.executemany(query, rows)
+        await self._write(run)
+
+    async def _fetchone(self, query: str, params: tuple = ()):
+        return await self._read(lambda cursor: cursor.execute(query, params).fetchone())
+
+    async def _fetchall(self, query: str, params: tuple = ()):
+        return await self._read(lambda cursor: cursor.execute(query, params).fetchall())
+
+    async def _fetchall_latest(self, query: str, params: tuple = ()):
+        return await self._read_latest(lambda cursor: cursor.execute(query, params).fetchall())
+
+    async def _create_schema(self):
+        version = await self._maintain(migrate)
+        logging.debug("Database schema at version %s", version)
+
+    async def _close_backend(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+
+    async def search_chats(self, query: str, limit: int) -> list:
+        # Every word is matched as a prefix, so "кар чат" finds "Карма-чат".
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        rows = await self._fetchall(
+            'SELECT rowid, chat_name FROM chats_fts WHERE chats_fts MATCH ? ORDER BY rank LIMIT ?',
+            (' '.join(f'"{term}"*' for term in terms), limit)
         )
-        return self.cursor.fetchall()
-
-    async def reset_monthly_karma_if_needed(self):
-        current_month = datetime.now().strftime('%Y-%m')
-        self.cursor.execute('SELECT DISTINCT chat_id FROM users')
-        chat_ids = [row[0] for row in self.cursor.fetchall()]
-
-        for chat_id in chat_ids:
-            self.cursor.execute('SELECT last_activity_month FROM users WHERE chat_id = ? LIMIT 1', (chat_id,))
-            last_activity_month = self.cursor.fetchone()
-            if last_activity_month and last_activity_month[0] != current_month:
-                self.cursor.execute('UPDATE users SET score = 0 WHERE chat_id = ?', (chat_id,))
-                self.conn.commit()
-                print(f"Karma reset for chat {chat_id} for new month.")
+        return [tuple(row) for row in rows]
+
+    async def rebuild_daily_rollup(self) -> int:
+        return await self._write(rebuild_daily_rollup)
+
+    async def compact_activity_log(self, retention_days: int, archive_dir: str, batch_size: int = 5000) -> int:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime('%Y-%m-%d 00:00:00')
+        os.makedirs(archive_dir, exist_ok=True)
+        archived = 0
+        while True:
+            # One batch per writer task, so votes queued meanwhile are not held up by the whole job.
+            moved = await self._maintain(self._archive_activity_batch, cutoff, archive_dir, batch_size)
+            archived += moved
+            if moved < batch_size:
+                break
+        await self._maintain(self._incremental_vacuum)
+        return archived
+
+    def _archive_activity_batch(self, conn, cutoff: str, archive_dir: str, batch_size: int) -> int:
+        rows = conn.execute(
+            'SELECT rowid, substr(timestamp, 1, 7) FROM activity_log WHERE timestamp < ? ORDER BY rowid LIMIT ?',
+            (cutoff, batch_size)
+        ).fetchall()
+        if not rows:
+            return 0
+
+        low, high = rows[0][0], rows[-1][0]
+        for month in sorted({month for _, month in rows}):
+            conn.execute('ATTACH DATABASE ? AS archive', (os.path.join(archive_dir, f'activity_{month}.db'),))
+            try:
+                with conn:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS archive.activity_log (
+                            source_rowid INTEGER NOT NULL,
+                            chat_id INTEGER,
+                            giver_id INTEGER,
+                            receiver_id INTEGER,
+                            score_change INTEGER,
+                            timestamp DATETIME,
+                            UNIQUE (source_rowid, timestamp)
+                        )
+                    ''')
+                    params = (low, high, cutoff, month)
+                    conn.execute('''
+                        INSERT OR IGNORE INTO archive.activity_log
+                        SELECT rowid, chat_id, giver_id, receiver_id, score_change, timestamp FROM main.activity_log
+                        WHERE rowid BETWEEN ? AND ? AND timestamp < ? AND substr(timestamp, 1, 7) = ?
+                    ''', params)
+                    conn.execute('''
+                        DELETE FROM main.activity_log
+                        WHERE rowid BETWEEN ? AND ? AND timestamp < ? AND substr(timestamp, 1, 7) = ?
+                    ''', params)
+            finally:
+                conn.execute('DETACH DATABASE archive')
+        return len(rows)
+
+    async def enable_incremental_vacuum(self) -> bool:
+        return await self._maintain(self._convert_to_incremental_vacuum)
+
+    @staticmethod
+    def _convert_to_incremental_vacuum(conn) -> bool:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        logging.info("Switching database to incremental auto_vacuum (full VACUUM).")
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+
+    @staticmethod
+    def _incremental_vacuum(conn):
+        # A full VACUUM would hold the writer thread for its whole run, so the nightly job only
+        # frees pages on databases already converted by "manage.py compact" or "migrate".
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            logging.debug("Skipping incremental vacuum: auto_vacuum is not INCREMENTAL.")
+            return
+        conn.execute('PRAGMA incremental_vacuum').fetchall()
+
+    def _shutdown(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
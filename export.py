@@ -0,0 +1,40 @@
+import asyncio
+import csv
+import gzip
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Bots may upload documents of up to 50 MB.
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+SCORES_HEADER = ('user_id', 'full_name', 'score', 'last_activity_month')
+ACTIVITY_HEADER = ('id', 'timestamp', 'giver_id', 'receiver_id', 'score_change')
+
+
+class ExportTooLarge(Exception):
+    pass
+
+
+async def write_csv_gz(header, chunks, directory: str = None) -> str:
+    # Each chunk is compressed and written off the event loop as it arrives, so memory stays at one chunk.
+    fd, path = tempfile.mkstemp(suffix='.csv.gz', dir=directory)
+    os.close(fd)
+    loop = asyncio.get_running_loop()
+    try:
+        stream = await loop.run_in_executor(_executor, lambda: gzip.open(path, 'wt', encoding='utf-8', newline=''))
+        try:
+            writer = csv.writer(stream)
+            await loop.run_in_executor(_executor, writer.writerow, header)
+            async for rows in chunks:
+                await loop.run_in_executor(_executor, writer.writerows, rows)
+        finally:
+            await loop.run_in_executor(_executor, stream.close)
+        if os.path.getsize(path) > TELEGRAM_UPLOAD_LIMIT:
+            raise ExportTooLarge(path)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
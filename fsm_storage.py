@@ -0,0 +1,60 @@
+import json
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+
+class DatabaseStorage(BaseStorage):
+    def __init__(self, db, cached: bool = False):
+        self.db = db
+        # FSM context is read on every update. When no other worker writes fsm_state, the few
+        # live rows are loaded once and served from memory; writes still go to the database.
+        self._cache = {} if cached else None
+
+    async def load(self):
+        if self._cache is not None:
+            self._cache = {key: (state, data) for key, state, data in await self.db.load_fsm()}
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ':'.join(str(part) for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id,
+                                               key.business_connection_id, key.destiny))
+
+    async def _get(self, key: str):
+        if self._cache is not None:
+            return self._cache.get(key, (None, None))
+        return await self.db.get_fsm(key)
+
+    def _remember(self, key: str, column: int, value):
+        if self._cache is None:
+            return
+        entry = list(self._cache.get(key, (None, None)))
+        entry[column] = value
+        state, data = entry
+        if state is None and data in (None, '{}'):
+            self._cache.pop(key, None)
+        else:
+            self._cache[key] = (state, data)
+
+    async def set_state(self, key: StorageKey, state=None):
+        key = self._key(key)
+        state = state.state if isinstance(state, State) else state
+        await self.db.set_fsm_state(key, state)
+        self._remember(key, 0, state)
+
+    async def get_state(self, key: StorageKey):
+        state, _ = await self._get(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data):
+        key = self._key(key)
+        data = json.dumps(dict(data))
+        await self.db.set_fsm_data(key, data)
+        self._remember(key, 1, data)
+
+    async def get_data(self, key: StorageKey) -> dict:
+        _, data = await self._get(self._key(key))
+        return json.loads(data) if data else {}
+
+    async def close(self):
+        pass
@@ -1,25 +1,51 @@
-import matplotlib.pyplot as plt
-from datetime import datetime
+import asyncio
 import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-async def generate_activity_graph(data, chat_id, year, month):
-    if not data:
-        return None
+# One rendering thread: matplotlib is not guaranteed thread-safe, but it must not run on the event loop either.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='graphs')
+_cache = OrderedDict()
+CACHE_SIZE = 64
+
+
+def _render_activity_graph(data, chat_id, year, month) -> bytes:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
 
     days = [datetime.strptime(row[0], '%Y-%m-%d').day for row in data]
     scores = [row[1] for row in data]
 
-    plt.figure(figsize=(10, 6))
-    plt.bar(days, scores, color='skyblue')
-    plt.xlabel('День месяца')
-    plt.ylabel('Сумма изменения баллов')
-    plt.title(f'Активность баллов в чате {chat_id} за {month}/{year}')
-    plt.xticks(days)
-    plt.grid(axis='y', linestyle='--')
-    plt.tight_layout()
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.bar(days, scores, color='skyblue')
+    ax.set_xlabel('День месяца')
+    ax.set_ylabel('Сумма изменения баллов')
+    ax.set_title(f'Активность баллов в чате {chat_id} за {month}/{year}')
+    ax.set_xticks(days)
+    ax.grid(axis='y', linestyle='--')
+    fig.tight_layout()
 
     buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    plt.close() 
-    return buffer
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+async def generate_activity_graph(data, chat_id, year, month, version=None):
+    if not data:
+        return None
+
+    key = (chat_id, year, month, version)
+    if version is not None and key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    loop = asyncio.get_running_loop()
+    png = await loop.run_in_executor(_executor, _render_activity_graph, data, chat_id, year, month)
+    if version is not None:
+        _cache[key] = png
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return png
@@ -0,0 +1,38 @@
+from bisect import bisect_left, insort
+
+
+class ChatLeaderboard:
+    def __init__(self, rows=()):
+        self._scores = dict(rows)
+        self._order = sorted((-score, user_id) for user_id, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._order)
+
+    def _discard(self, user_id: int):
+        score = self._scores.pop(user_id, None)
+        if score is not None:
+            del self._order[bisect_left(self._order, (-score, user_id))]
+
+    def update(self, user_id: int, score: int):
+        self._discard(user_id)
+        self._scores[user_id] = score
+        insort(self._order, (-score, user_id))
+
+    def remove(self, user_id: int):
+        self._discard(user_id)
+
+    def reset(self):
+        self.__init__((user_id, 0) for user_id in self._scores)
+
+    def score(self, user_id: int) -> int:
+        return self._scores.get(user_id, 0)
+
+    def rank(self, user_id: int):
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._order, (-score, user_id)) + 1
+
+    def top(self, limit: int = 10, offset: int = 0) -> list:
+        return [(user_id, -neg_score) for neg_score, user_id in self._order[offset:offset + limit]]
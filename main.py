@@ -1,47 +1,134 @@
 import asyncio
+import functools
 import logging
 import os
-from datetime import datetime
+import re
+import time
+from datetime import datetime, timedelta, timezone
 
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import BufferedInputFile, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import BufferedInputFile, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton
+from aiohttp import web
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from config import BOT_TOKEN, SUPER_ADMIN_ID, DB_NAME
-from db import Database
+from config import (BOT_TOKEN, SUPER_ADMIN_ID, DB_BACKEND, DB_NAME, DB_READ_WORKERS, DB_BUSY_TIMEOUT,
+                    DB_SYNCHRONOUS, DB_MMAP_SIZE, DB_CACHE_SIZE_KB,
+                    DATABASE_URL, PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE,
+                    WRITE_FLUSH_INTERVAL_MS, WRITE_FLUSH_MAX_ROWS, ADMIN_CACHE_TTL, ADMIN_CACHE_FAILURE_TTL,
+                    NAME_CACHE_SIZE, NAME_LOOKUP_CONCURRENCY, TOP_PAGE_SIZE, TOP_MAX_LIMIT, CHAT_PAGE_SIZE,
+                    DASHBOARD_DAYS, DASHBOARD_TOP_GIVERS, EXPORT_CHUNK_SIZE,
+                    OUTBOX_CHAT_RATE_PER_MINUTE, OUTBOX_CHAT_BURST, OUTBOX_GLOBAL_RATE, VOTE_COALESCE_SECONDS,
+                    VOTE_GIVER_COOLDOWN, VOTE_RECEIVER_COOLDOWN, VOTE_DAILY_CAP, VOTE_THROTTLE_CAPACITY,
+                    VOTE_THROTTLE_PERSIST_SECONDS,
+                    ACTIVITY_RETENTION_DAYS, ACTIVITY_ARCHIVE_DIR, COMPACTION_BATCH_SIZE,
+                    BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET,
+                    SHARED_STATE, FSM_STORAGE, WORKER_ID, LEADER_LEASE_TTL, SHARED_STATE_SYNC_SECONDS,
+                    LOG_LEVEL, LOG_FORMAT, METRICS_HOST, METRICS_PORT)
+from admins import ChatAdminCache
+from names import NameCache
+from outbox import Outbox
+from throttle import VotePolicy, VoteThrottle
+from storage import create_database
+from fsm_storage import DatabaseStorage
 from graphs import generate_activity_graph
+from export import SCORES_HEADER, ACTIVITY_HEADER, ExportTooLarge, write_csv_gz
+from logs import setup_logging
+import metrics
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging(LOG_LEVEL, LOG_FORMAT)
+# Per-update timing is exported as a metric; aiogram's own INFO line per update is redundant.
+logging.getLogger('aiogram.event').setLevel(logging.WARNING)
 
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-db = Database(DB_NAME)
-scheduler = AsyncIOScheduler()
+db = create_database(DB_BACKEND, sqlite_path=DB_NAME, read_workers=DB_READ_WORKERS, busy_timeout=DB_BUSY_TIMEOUT,
+                     sqlite_pragmas={'synchronous': DB_SYNCHRONOUS, 'mmap_size': DB_MMAP_SIZE,
+                                     'cache_size': -DB_CACHE_SIZE_KB},
+                     postgres_dsn=DATABASE_URL, pool_min_size=PG_POOL_MIN_SIZE, pool_max_size=PG_POOL_MAX_SIZE,
+                     flush_interval=WRITE_FLUSH_INTERVAL_MS / 1000, flush_max_rows=WRITE_FLUSH_MAX_ROWS,
+                     shared=SHARED_STATE, sharded=BOT_MODE == 'worker')
+# Other workers write fsm_state in shared mode, so only a single process may serve it from memory.
+fsm_storage = DatabaseStorage(db, cached=not SHARED_STATE) if SHARED_STATE or FSM_STORAGE == 'database' else MemoryStorage()
+dp = Dispatcher(storage=fsm_storage)
+scheduler = None
+admin_cache = ChatAdminCache(bot, ttl=ADMIN_CACHE_TTL, failure_ttl=ADMIN_CACHE_FAILURE_TTL)
+name_cache = NameCache(bot, db, capacity=NAME_CACHE_SIZE, concurrency=NAME_LOOKUP_CONCURRENCY)
+outbox = Outbox(bot, chat_rate_per_minute=OUTBOX_CHAT_RATE_PER_MINUTE, chat_burst=OUTBOX_CHAT_BURST,
+                global_rate=OUTBOX_GLOBAL_RATE, coalesce_window=VOTE_COALESCE_SECONDS)
+metrics.setup(dp, bot, db)
+metrics_runner = None
+throttle = VoteThrottle(db, VotePolicy(VOTE_GIVER_COOLDOWN, VOTE_RECEIVER_COOLDOWN, VOTE_DAILY_CAP),
+                        capacity=VOTE_THROTTLE_CAPACITY)
+
+ADMIN_STATUSES = {'creator', 'administrator'}
+VOTE_PATTERN = re.compile(r'\s*([+-])1\s*')
+MONTH_PATTERN = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+ID_SEPARATOR = re.compile(r'[\s,;]+')
+ALL_CHATS = {'все', 'all'}
 
 class AdminStates(StatesGroup):
     waiting_for_user_id = State()
     waiting_for_admin_user_id_to_remove = State()
+    waiting_for_chat_search = State()
+    waiting_for_bulk_admins = State()
+    waiting_for_bulk_reset = State()
 
 
+def parse_vote(text) -> int:
+    if text is None or len(text) > 8:
+        return 0
+    match = VOTE_PATTERN.fullmatch(text)
+    if match is None:
+        return 0
+    return 1 if match.group(1) == '+' else -1
+
+
+def parse_ids(text) -> list:
+    ids = [int(token) for token in ID_SEPARATOR.split(text or '') if token]
+    if not ids:
+        raise ValueError("no ids")
+    return list(dict.fromkeys(ids))
+
+
+async def parse_chat_ids(text) -> list:
+    if (text or '').strip().lower() in ALL_CHATS:
+        return [chat_id for chat_id, _ in await db.get_chats()]
+    return parse_ids(text)
+
+
+# aiogram runs plain functions used as filters in a worker thread; coroutine filters stay on the event loop.
+async def is_vote(message: types.Message) -> bool:
+    return parse_vote(message.text) != 0
+
+async def is_not_vote(message: types.Message) -> bool:
+    return not parse_vote(message.text)
+
+def callback_prefix(prefix: str):
+    async def check(callback_query: types.CallbackQuery) -> bool:
+        return callback_query.data.startswith(prefix)
+    return check
+
 async def is_super_admin(user_id: int) -> bool:
     return user_id == SUPER_ADMIN_ID
 
 async def check_group_admin(member_id: int, chat_id: int) -> bool:
-    try:
-        chat_member = await bot.get_chat_member(chat_id, member_id)
-        return chat_member.status in ['creator', 'administrator']
-    except Exception as e:
-        logging.error(f"Error checking group admin for {member_id} in {chat_id}: {e}")
-        return False
+    return await admin_cache.is_admin(member_id, chat_id)
     
 
+@dp.message.outer_middleware()
+async def remember_user_names(handler, message: types.Message, data: dict):
+    name_cache.remember(message.from_user)
+    if message.reply_to_message:
+        name_cache.remember(message.reply_to_message.from_user)
+    return await handler(message, data)
+
+
 @dp.chat_member()
 async def on_user_left(event: types.ChatMemberUpdated):
     old_status = event.old_chat_member.status
@@ -49,11 +136,13 @@ async def on_user_left(event: types.ChatMemberUpdated):
     user_id = event.from_user.id
     chat_id = event.chat.id
 
+    if old_status != new_status and (old_status in ADMIN_STATUSES or new_status in ADMIN_STATUSES):
+        admin_cache.invalidate(chat_id)
+
     if old_status in ["member", "restricted", "administrator"] and new_status in ["left", "kicked"]:
-        db.cursor.execute('DELETE FROM users WHERE user_id = ? AND chat_id = ?', (user_id, chat_id))
-        db.conn.commit()
+        await db.delete_user(user_id, chat_id)
 
-        logging.info(f"Пользователь {user_id} вышел из чата {chat_id}. Статистика удалена/обнулена.")
+        logging.info("User %s left chat %s, their score was removed.", user_id, chat_id)
 
 
 @dp.message(Command("start"))
@@ -63,7 +152,9 @@ async def cmd_start(message: types.Message):
         if await is_super_admin(message.from_user.id):
             await message.answer(
                 "Ты Главный Администратор! Вот твоя панель управления:\n"
-                "/admin_panel - Вывести панель управления главного админа."
+                "/admin_panel - Вывести панель управления главного админа.\n"
+                "/dashboard - Сводная статистика по всем чатам.\n"
+                "/export <ID чата> [с YYYY-MM-DD] [по YYYY-MM-DD] - Выгрузка баллов и истории в CSV."
             )
     else:
         await message.answer("Привет! Чтобы я начал работать, администратор чата должен назначить мне админов через личное сообщение со мной.")
@@ -73,26 +164,66 @@ async def cmd_my_debug_id(message: types.Message):
     await message.answer(f"Твой ID: {message.from_user.id}\nSUPER_ADMIN_ID из конфига: {SUPER_ADMIN_ID}")
 
 
+async def render_top(chat_id: int, limit: int, offset: int = 0, month: str = None):
+    if month is None:
+        top_users = await db.get_top_users(chat_id, limit, offset)
+    else:
+        top_users = await db.get_archived_top_users(chat_id, month, limit, offset)
+    if not top_users:
+        return None, None
+
+    names = await name_cache.resolve(chat_id, [user_id for user_id, _ in top_users])
+    if month is None:
+        response = f"{('Топ пользователей по баллам в этом месяце:')}\n"
+    else:
+        response = f"Топ пользователей по баллам за {month}:\n"
+    for i, (user_id, score) in enumerate(top_users, start=offset):
+        user_name = names.get(user_id, f"Пользователь ID:{user_id}")
+        response += f"{i+1}. {(user_name)}: {score}\n"
+
+    total = await db.count_users(chat_id) if month is None else await db.count_archived_users(chat_id, month)
+    suffix = f":{month}" if month else ""
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton(text="« Назад", callback_data=f"top_page:{max(0, offset - limit)}:{limit}{suffix}"))
+    if offset + limit < total:
+        buttons.append(InlineKeyboardButton(text="Далее »", callback_data=f"top_page:{offset + limit}:{limit}{suffix}"))
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+    return response, keyboard
+
 @dp.message(Command("top"))
-async def cmd_top(message: types.Message):
+async def cmd_top(message: types.Message, command: CommandObject):
     if message.chat.type == 'private':
         await message.answer("Эту команду нужно использовать в групповом чате.")
         return
 
-    top_users = await db.get_top_users(message.chat.id)
-    if not top_users:
-        await message.answer("Топ еще пуст.")
+    limit = TOP_PAGE_SIZE
+    month = None
+    for arg in (command.args or "").split():
+        if arg.isdigit():
+            limit = min(max(int(arg), 1), TOP_MAX_LIMIT)
+        elif MONTH_PATTERN.fullmatch(arg):
+            month = arg
+        else:
+            await message.answer("Использование: /top [ГГГГ-ММ] [количество]")
+            return
+
+    response, keyboard = await render_top(message.chat.id, limit, month=month)
+    if response is None:
+        await message.answer("Топ еще пуст." if month is None else f"Нет сохраненного топа за {month}.")
         return
+    await message.answer(response, reply_markup=keyboard)
 
-    response = f"{('Топ пользователей по баллам в этом месяце:')}\n"
-    for i, (user_id, score) in enumerate(top_users):
-        try:
-            member = await bot.get_chat_member(message.chat.id, user_id)
-            user_name = member.user.full_name
-        except Exception:
-            user_name = f"Пользователь ID:{user_id}"
-        response += f"{i+1}. {(user_name)}: {score}\n"
-    await message.answer(response)
+@dp.callback_query(callback_prefix('top_page:'))
+async def process_top_page(callback_query: types.CallbackQuery):
+    _, offset, limit, *month = callback_query.data.split(":")
+    offset = max(int(offset), 0)
+    limit = min(max(int(limit), 1), TOP_MAX_LIMIT)
+    await callback_query.answer()
+
+    response, keyboard = await render_top(callback_query.message.chat.id, limit, offset, month[0] if month else None)
+    if response is not None:
+        await callback_query.message.edit_text(response, reply_markup=keyboard)
 
 @dp.message(Command("mystats"))
 async def cmd_mystats(message: types.Message):
@@ -101,87 +232,160 @@ async def cmd_mystats(message: types.Message):
         return
 
     score = await db.get_user_score(message.from_user.id, message.chat.id)
-    await message.answer(f"Твои баллы в этом чате за текущий месяц: {(score)}.")
+    rank, total = await db.get_user_rank(message.from_user.id, message.chat.id)
+    response = f"Твои баллы в этом чате за текущий месяц: {(score)}."
+    if rank is not None:
+        response += f"\nМесто в топе: {rank} из {total}."
+    await message.answer(response)
 
 @dp.message(Command("admin_panel"))
 async def cmd_admin_panel(message: types.Message):
-    logging.info(f"Attempted /admin_panel by user {message.from_user.id} in chat type: {message.chat.type}")
+    logging.debug("Attempted /admin_panel by user %s in chat type %s", message.from_user.id, message.chat.type)
 
     if not await is_super_admin(message.from_user.id):
-        logging.warning(f"User {message.from_user.id} is NOT super admin. Access denied.")
+        logging.warning("User %s is not super admin, /admin_panel denied.", message.from_user.id)
         return await message.reply("Доступ запрещен или команда должна быть в личной переписке с ботом.")
     
     if message.chat.type != 'private':
-        logging.warning(f"User {message.from_user.id} tried /admin_panel in non-private chat ({message.chat.type}). Access denied.")
+        logging.warning("User %s tried /admin_panel in a %s chat, denied.", message.from_user.id, message.chat.type)
         return await message.reply("Доступ запрещен или команда должна быть в личной переписке с ботом.")
 
-    logging.info(f"User {message.from_user.id} is super admin and in private chat. Displaying admin panel.")
+    logging.debug("Displaying admin panel to super admin %s.", message.from_user.id)
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Добавить админа", callback_data="super_admin_add_admin")],
         [InlineKeyboardButton(text="Удалить админа", callback_data="super_admin_remove_admin")],
         [InlineKeyboardButton(text="Показать админов чата", callback_data="super_admin_list_chats")],  # ИЗМЕНЕНО
         [InlineKeyboardButton(text="Показать график активности", callback_data="super_admin_activity_chats")], # ИЗМЕНЕНО
-        [InlineKeyboardButton(text="Сбросить баллы вручную", callback_data="super_admin_reset_karma_chats")] # ИЗМЕНЕНО
+        [InlineKeyboardButton(text="Сбросить баллы вручную", callback_data="super_admin_reset_karma_chats")], # ИЗМЕНЕНО
+        [InlineKeyboardButton(text="Добавить админов в несколько чатов", callback_data="super_admin_bulk_add_admins")],
+        [InlineKeyboardButton(text="Удалить админов из нескольких чатов", callback_data="super_admin_bulk_remove_admins")],
+        [InlineKeyboardButton(text="Сбросить баллы в нескольких чатах", callback_data="super_admin_bulk_reset_karma")],
     ])
     await message.answer("Панель управления главного админа:", reply_markup=keyboard)
 
 
-@dp.callback_query(lambda c: c.data.startswith('super_admin_'))
+CHAT_ACTIONS = {
+    'super_admin_add_admin': 'add_admin',
+    'super_admin_remove_admin': 'remove_admin',
+    'super_admin_list_chats': 'list_admins',
+    'super_admin_activity_chats': 'activity_graph',
+    'super_admin_reset_karma_chats': 'reset_karma',
+}
+CHAT_ACTION_PROMPTS = {
+    'add_admin': "Выберите чат:",
+    'remove_admin': "Выберите чат:",
+    'list_admins': "Выберите чат для просмотра админов:",
+    'activity_graph': "Выберите чат для просмотра графика активности:",
+    'reset_karma': "Выберите чат для сброса баллов:",
+}
+BULK_ADMIN_PROMPT = ("Отправьте одним сообщением две строки:\n"
+                     "1) ID пользователей через пробел или запятую;\n"
+                     "2) ID чатов через пробел или запятую, либо «все».")
+BULK_ACTIONS = {
+    'super_admin_bulk_add_admins': (AdminStates.waiting_for_bulk_admins, 'add', BULK_ADMIN_PROMPT),
+    'super_admin_bulk_remove_admins': (AdminStates.waiting_for_bulk_admins, 'remove', BULK_ADMIN_PROMPT),
+    'super_admin_bulk_reset_karma': (AdminStates.waiting_for_bulk_reset, 'reset',
+                                     "Отправьте ID чатов через пробел или запятую, либо «все»."),
+}
+
+def chat_buttons(action: str, chats) -> list:
+    return [[InlineKeyboardButton(text=chat_name or str(chat_id), callback_data=f"select_chat_{action}:{chat_id}")]
+            for chat_id, chat_name in chats]
+
+async def render_chat_page(action: str, after: int = None, before: int = None):
+    chats, has_prev, has_next = await db.get_chats_page(CHAT_PAGE_SIZE, after=after, before=before)
+    if not chats:
+        return None
+    rows = chat_buttons(action, chats)
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(text="« Назад", callback_data=f"chats_page:{action}:p:{chats[0][0]}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text="Далее »", callback_data=f"chats_page:{action}:n:{chats[-1][0]}"))
+    if navigation:
+        rows.append(navigation)
+    rows.append([InlineKeyboardButton(text="Поиск по названию", callback_data=f"chats_search:{action}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+@dp.callback_query(callback_prefix('super_admin_'))
 async def process_admin_callbacks(callback_query: types.CallbackQuery, state: FSMContext):
     if not await is_super_admin(callback_query.from_user.id):
         await callback_query.answer("Доступ запрещен.", show_alert=True)
         return
 
-    action = callback_query.data
-    await callback_query.answer() 
+    await callback_query.answer()
+    bulk = BULK_ACTIONS.get(callback_query.data)
+    if bulk is not None:
+        bulk_state, bulk_action, prompt = bulk
+        await state.update_data(bulk_action=bulk_action)
+        await state.set_state(bulk_state)
+        await callback_query.message.edit_text(prompt)
+        return
 
-    chats = db.get_chats()
-    if not chats:
-        await callback_query.message.edit_text("Пока нет зарегистрированных чатов. Убедитесь, что бот получил хотя бы одно сообщение из каждого группового чата/канала, которым вы хотите управлять.")
-        return 
+    action = CHAT_ACTIONS.get(callback_query.data)
+    if action is None:
+        return
 
+    keyboard = await render_chat_page(action)
+    if keyboard is None:
+        await callback_query.message.edit_text("Пока нет зарегистрированных чатов. Убедитесь, что бот получил хотя бы одно сообщение из каждого группового чата/канала, которым вы хотите управлять.")
+        return
 
-    if action == "super_admin_add_admin":
+    if action == 'add_admin':
         await callback_query.message.edit_text("Для добавления админа, укажите ID пользователя, которого хотите сделать админом. (После выбора чата)")
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=chat_name, callback_data=f"select_chat_add_admin:{chat_id}")]
-            for chat_id, chat_name in chats
-        ])
-        await callback_query.message.answer("Выберите чат:", reply_markup=keyboard)
-
-    elif action == "super_admin_remove_admin":
-        await callback_query.message.edit_text("Для удаления админа, укажите ID пользователя, которого хотите удалить из админов. (После выбора чата)")
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=chat_name, callback_data=f"select_chat_remove_admin:{chat_id}")]
-            for chat_id, chat_name in chats
-        ])
-        await callback_query.message.edit_text("Выберите чат:", reply_markup=keyboard)
-
-
-    elif action == "super_admin_list_chats":
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=chat_name, callback_data=f"select_chat_list_admins:{chat_id}")]
-            for chat_id, chat_name in chats
-        ])
-        await callback_query.message.edit_text("Выберите чат для просмотра админов:", reply_markup=keyboard)
-
-    elif action == "super_admin_activity_chats":
-         keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=chat_name, callback_data=f"select_chat_activity_graph:{chat_id}")]
-            for chat_id, chat_name in chats
-         ])
-         await callback_query.message.edit_text("Выберите чат для просмотра графика активности:", reply_markup=keyboard)
-
-    elif action == "super_admin_reset_karma_chats":
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=chat_name, callback_data=f"select_chat_reset_karma:{chat_id}")]
-            for chat_id, chat_name in chats
-        ])
-        await callback_query.message.edit_text("Выберите чат для сброса баллов:", reply_markup=keyboard)
-
-
-@dp.callback_query(lambda c: c.data.startswith('select_chat_'))
+        await callback_query.message.answer(CHAT_ACTION_PROMPTS[action], reply_markup=keyboard)
+    else:
+        await callback_query.message.edit_text(CHAT_ACTION_PROMPTS[action], reply_markup=keyboard)
+
+@dp.callback_query(callback_prefix('chats_page:'))
+async def process_chats_page(callback_query: types.CallbackQuery):
+    if not await is_super_admin(callback_query.from_user.id):
+        await callback_query.answer("Доступ запрещен.", show_alert=True)
+        return
+
+    _, action, direction, cursor = callback_query.data.split(":")
+    await callback_query.answer()
+    if direction == 'p':
+        keyboard = await render_chat_page(action, before=int(cursor))
+    else:
+        keyboard = await render_chat_page(action, after=int(cursor))
+    if keyboard is not None:
+        await callback_query.message.edit_text(CHAT_ACTION_PROMPTS[action], reply_markup=keyboard)
+
+@dp.callback_query(callback_prefix('chats_search:'))
+async def process_chats_search(callback_query: types.CallbackQuery, state: FSMContext):
+    if not await is_super_admin(callback_query.from_user.id):
+        await callback_query.answer("Доступ запрещен.", show_alert=True)
+        return
+
+    await callback_query.answer()
+    await state.update_data(chat_action=callback_query.data.split(":")[1])
+    await state.set_state(AdminStates.waiting_for_chat_search)
+    await callback_query.message.edit_text("Введите часть названия чата:")
+
+@dp.message(AdminStates.waiting_for_chat_search)
+async def process_chat_search_query(message: types.Message, state: FSMContext):
+    if not await is_super_admin(message.from_user.id): return
+
+    action = (await state.get_data()).get("chat_action")
+    await state.clear()
+    if action not in CHAT_ACTION_PROMPTS:
+        await message.answer("Действие не выбрано. Начните сначала с /admin_panel.")
+        return
+
+    chats = await db.search_chats(message.text or "", CHAT_PAGE_SIZE + 1)
+    if not chats:
+        await message.answer("Чаты с таким названием не найдены.")
+        return
+    rows = chat_buttons(action, chats[:CHAT_PAGE_SIZE])
+    text = CHAT_ACTION_PROMPTS[action]
+    if len(chats) > CHAT_PAGE_SIZE:
+        text += f"\nПоказаны первые {CHAT_PAGE_SIZE} совпадений, уточните запрос."
+    await message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+
+
+@dp.callback_query(callback_prefix('select_chat_'))
 async def process_chat_selection(callback_query: types.CallbackQuery, state: FSMContext):
     if not await is_super_admin(callback_query.from_user.id):
         await callback_query.answer("Доступ запрещен.", show_alert=True)
@@ -193,12 +397,12 @@ async def process_chat_selection(callback_query: types.CallbackQuery, state: FSM
 
     if action.startswith("select_chat_add_admin"):
 
-        await callback_query.message.edit_text(f"Выбран чат ID {chat_id}.  Теперь укажите ID пользователя, которого хотите сделать админом.")
+        await callback_query.message.edit_text(f"Выбран чат ID {chat_id}.  Теперь укажите ID пользователя, которого хотите сделать админом (можно несколько через пробел или запятую).")
         await state.update_data(selected_chat_id=chat_id)
         await state.set_state(AdminStates.waiting_for_user_id)
 
     elif action.startswith("select_chat_remove_admin"):
-        await callback_query.message.edit_text(f"Выбран чат ID {chat_id}. Теперь укажите ID пользователя, которого хотите удалить из админов.")
+        await callback_query.message.edit_text(f"Выбран чат ID {chat_id}. Теперь укажите ID пользователя, которого хотите удалить из админов (можно несколько через пробел или запятую).")
         await state.update_data(selected_chat_id=chat_id)
         await state.set_state(AdminStates.waiting_for_admin_user_id_to_remove)
 
@@ -208,14 +412,10 @@ async def process_chat_selection(callback_query: types.CallbackQuery, state: FSM
         if not admin_ids:
              await callback_query.message.edit_text(f"В чате {chat_id} нет назначенных ботом админов.")
         else:
+            names = await name_cache.resolve(chat_id, admin_ids)
             response = f"Админы чата {chat_id}:\n"
             for admin_id in admin_ids:
-                try:
-                    member = await bot.get_chat_member(chat_id, admin_id)
-                    response += f"- {(member.user.full_name if member.user.full_name else 'Неизвестный')} (ID: {admin_id})\n"
-                except Exception as e:
-                    logging.error(f"Error getting chat member for {admin_id} in {chat_id}: {e}")
-                    response += f"- Неизвестный пользователь (ID: {admin_id})\n"
+                response += f"- {names.get(admin_id, 'Неизвестный пользователь')} (ID: {admin_id})\n"
             await callback_query.message.edit_text(response)
 
     elif action.startswith("select_chat_activity_graph"):
@@ -224,14 +424,15 @@ async def process_chat_selection(callback_query: types.CallbackQuery, state: FSM
          current_year = datetime.now().year
          current_month = datetime.now().month
 
+         version = await db.get_activity_version(chat_id, current_year, current_month)
          activity_data = await db.get_monthly_activity(chat_id, current_year, current_month)
          if not activity_data:
              await callback_query.message.edit_text(f"Нет данных об активности баллов в чате {chat_id} за текущий месяц.")
 
          else:
-             graph_buffer = await generate_activity_graph(activity_data, chat_id, current_year, current_month)
-             if graph_buffer:
-                await bot.send_photo(callback_query.message.chat.id, photo=BufferedInputFile(graph_buffer.getvalue(), filename="activity_graph.png"))
+             graph_png = await generate_activity_graph(activity_data, chat_id, current_year, current_month, version)
+             if graph_png:
+                await bot.send_photo(callback_query.message.chat.id, photo=BufferedInputFile(graph_png, filename="activity_graph.png"))
 
              else:
                 await callback_query.message.edit_text("Не удалось сгенерировать график.")
@@ -239,8 +440,7 @@ async def process_chat_selection(callback_query: types.CallbackQuery, state: FSM
     elif action.startswith("select_chat_reset_karma"):
          await callback_query.message.edit_text(f"Выбран чат ID {chat_id}. Сбрасываю баллы...")
 
-         db.cursor.execute('UPDATE users SET score = 0 WHERE chat_id = ?', (chat_id,))
-         db.conn.commit()
+         await db.reset_chat_scores(chat_id)
          await callback_query.message.edit_text(f"Баллы в чате {chat_id} успешно сброшены вручную!")
 
 @dp.message(AdminStates.waiting_for_user_id)
@@ -248,7 +448,7 @@ async def process_add_admin_data(message: types.Message, state: FSMContext):
     if not await is_super_admin(message.from_user.id): return
 
     try:
-       user_id_to_add = int(message.text.strip())
+       user_ids = parse_ids(message.text)
        data = await state.get_data()
        chat_id = data.get("selected_chat_id")
 
@@ -257,11 +457,12 @@ async def process_add_admin_data(message: types.Message, state: FSMContext):
            await state.clear()
            return
 
-       await db.add_admin(user_id_to_add, chat_id)
-       await message.answer(f"Пользователь {user_id_to_add} добавлен в админы чата {chat_id}.")
+       await db.add_admins(user_ids, [chat_id])
+       await message.answer(f"Пользователи {', '.join(map(str, user_ids))} добавлены в админы чата {chat_id}."
+                            if len(user_ids) > 1 else f"Пользователь {user_ids[0]} добавлен в админы чата {chat_id}.")
 
     except ValueError:
-        await message.answer("Неверный формат ID пользователя. Пожалуйста, введите только число.")
+        await message.answer("Неверный формат ID пользователя. Пожалуйста, введите числа через пробел или запятую.")
     finally:
        await state.clear()
 
@@ -271,7 +472,7 @@ async def process_remove_admin_data(message: types.Message, state: FSMContext):
     if not await is_super_admin(message.from_user.id): return
 
     try:
-        user_id_to_remove = int(message.text.strip())
+        user_ids = parse_ids(message.text)
         data = await state.get_data()
         chat_id = data.get("selected_chat_id")
 
@@ -279,26 +480,145 @@ async def process_remove_admin_data(message: types.Message, state: FSMContext):
             await message.answer("Чат не выбран. Начните сначала с выбора чата.")
             await state.clear()
             return
-        await db.remove_admin(user_id_to_remove, chat_id)
-        await message.answer(f"Пользователь {user_id_to_remove} удален из админов чата {chat_id}.")
+        await db.remove_admins(user_ids, [chat_id])
+        await message.answer(f"Пользователи {', '.join(map(str, user_ids))} удалены из админов чата {chat_id}."
+                             if len(user_ids) > 1 else f"Пользователь {user_ids[0]} удален из админов чата {chat_id}.")
 
     except ValueError:
-        await message.answer("Неверный формат ID пользователя. Пожалуйста, введите только число.")
+        await message.answer("Неверный формат ID пользователя. Пожалуйста, введите числа через пробел или запятую.")
     finally:
         await state.clear()
 
-@dp.message(lambda m: m.text not in ['+1', '-1'])
-async def get_chat_id_from_forward(message: types.Message):
-    logging.info(f"Received message in get_chat_id_from_forward from {message.from_user.id}. Chat type: {message.chat.type}")
 
-   # if message.text in ['+1', '-1']:
-    #    return
+@dp.message(AdminStates.waiting_for_bulk_admins)
+async def process_bulk_admins(message: types.Message, state: FSMContext):
+    if not await is_super_admin(message.from_user.id): return
 
+    action = (await state.get_data()).get("bulk_action")
+    await state.clear()
+    lines = (message.text or "").strip().splitlines()
+    try:
+        if len(lines) != 2:
+            raise ValueError("expected two lines")
+        user_ids = parse_ids(lines[0])
+        chat_ids = await parse_chat_ids(lines[1])
+    except ValueError:
+        await message.answer("Неверный формат. Нужны две строки: ID пользователей и ID чатов (или «все»).")
+        return
+    if not chat_ids:
+        await message.answer("Пока нет зарегистрированных чатов.")
+        return
 
-    if message.chat.type in ['group', 'supergroup', 'channel']:
-        db.add_chat(message.chat.id, message.chat.title or "Без названия", message.chat.type)
-        logging.info(f"Chat {message.chat.title} (ID: {message.chat.id}) added/updated in database by get_chat_id_from_forward.")
+    if action == 'add':
+        changed = await db.add_admins(user_ids, chat_ids)
+        await message.answer(f"Добавлено назначений: {changed} (пользователей: {len(user_ids)}, чатов: {len(chat_ids)}).")
+    else:
+        changed = await db.remove_admins(user_ids, chat_ids)
+        await message.answer(f"Удалено назначений: {changed} (пользователей: {len(user_ids)}, чатов: {len(chat_ids)}).")
+    logging.info("Super admin %s bulk %s admins: %s users x %s chats, %s changed.",
+                 message.from_user.id, action, len(user_ids), len(chat_ids), changed)
+
+
+@dp.message(AdminStates.waiting_for_bulk_reset)
+async def process_bulk_reset(message: types.Message, state: FSMContext):
+    if not await is_super_admin(message.from_user.id): return
+
+    await state.clear()
+    try:
+        chat_ids = await parse_chat_ids(message.text)
+    except ValueError:
+        await message.answer("Неверный формат. Введите ID чатов через пробел или запятую, либо «все».")
+        return
+    if not chat_ids:
+        await message.answer("Пока нет зарегистрированных чатов.")
+        return
+
+    reset = await db.reset_chats_scores(chat_ids)
+    await message.answer(f"Баллы сброшены в {reset} чатах.")
+    logging.info("Super admin %s reset scores in %s chats.", message.from_user.id, reset)
+
+
+@dp.message(Command("dashboard"))
+async def cmd_dashboard(message: types.Message):
+    if not await is_super_admin(message.from_user.id) or message.chat.type != 'private':
+        return await message.reply("Доступ запрещен или команда должна быть в личной переписке с ботом.")
+
+    since = (datetime.now() - timedelta(days=DASHBOARD_DAYS - 1)).strftime('%Y-%m-%d')
+    rows = await db.get_dashboard(since, DASHBOARD_TOP_GIVERS)
+    total = next(row for row in rows if row[0] == 'total')
+    days = sorted((row[2], row[3]) for row in rows if row[0] == 'day')
+    givers = [(row[1], row[3], row[4]) for row in rows if row[0] == 'giver']
+
+    lines = [
+        f"Сводка по всем чатам за {DASHBOARD_DAYS} дн. (с {since}):",
+        f"Голосов: {total[3]} (в среднем {total[3] / DASHBOARD_DAYS:.1f} в день)",
+        f"Активных чатов: {total[4]}",
+        f"Активных пользователей: {total[5]}",
+    ]
+    if days:
+        lines.append("\nГолоса по дням (последние 7):")
+        lines.extend(f"{day}: {count}" for day, count in days[-7:])
+    if givers:
+        names = await db.get_user_names(giver_id for giver_id, _, _ in givers)
+        lines.append("\nСамые активные голосующие:")
+        lines.extend(f"{i}. {names.get(giver_id, f'ID {giver_id}')} — {votes} голосов в {chats} чатах"
+                     for i, (giver_id, votes, chats) in enumerate(givers, start=1))
+    await message.answer("\n".join(lines))
+
+async def send_export(chat_id: int, filename: str, header, chunks) -> bool:
+    try:
+        path = await write_csv_gz(header, chunks)
+    except ExportTooLarge:
+        await bot.send_message(chat_id, f"Файл {filename} больше 50 МБ, сузьте диапазон дат.")
+        return False
+    try:
+        await bot.send_document(chat_id, FSInputFile(path, filename=filename))
+    finally:
+        os.unlink(path)
+    return True
+
+
+@dp.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject):
+    if not await is_super_admin(message.from_user.id) or message.chat.type != 'private':
+        return await message.reply("Доступ запрещен или команда должна быть в личной переписке с ботом.")
+
+    usage = "Использование: /export <ID чата> [с YYYY-MM-DD] [по YYYY-MM-DD]"
+    args = (command.args or "").split()
+    if not 1 <= len(args) <= 3:
+        return await message.answer(usage)
+    try:
+        chat_id = int(args[0])
+        today = datetime.now().date()
+        since = datetime.strptime(args[1], '%Y-%m-%d').date() if len(args) > 1 else today.replace(day=1)
+        until = datetime.strptime(args[2], '%Y-%m-%d').date() if len(args) > 2 else today
+    except ValueError:
+        return await message.answer(usage)
+    if since > until:
+        return await message.answer("Начальная дата позже конечной.")
+
+    await message.answer(f"Готовлю выгрузку чата {chat_id} за {since}–{until}...")
+    # The export reads only the live activity_log; compaction has already moved older rows to the archive.
+    archived_before = datetime.now(timezone.utc).date() - timedelta(days=ACTIVITY_RETENTION_DAYS)
+    if ACTIVITY_RETENTION_DAYS > 0 and since < archived_before:
+        await message.answer(f"Внимание: записи активности до {archived_before} перенесены в архив "
+                             f"и в выгрузку не попадут.")
+    # Queued write-behind rows would otherwise be missing from the export.
+    await db.flush()
+    await send_export(message.chat.id, f"scores_{chat_id}.csv.gz", SCORES_HEADER,
+                      db.iter_chat_scores(chat_id, EXPORT_CHUNK_SIZE))
+    await send_export(message.chat.id, f"activity_{chat_id}_{since}_{until}.csv.gz", ACTIVITY_HEADER,
+                      db.iter_activity(chat_id, since.isoformat(), (until + timedelta(days=1)).isoformat(),
+                                       EXPORT_CHUNK_SIZE))
+    logging.info("Super admin %s exported chat %s for %s..%s.", message.from_user.id, chat_id, since, until)
+
+
+@dp.message(is_not_vote)
+async def get_chat_id_from_forward(message: types.Message):
+    logging.debug("Received message in get_chat_id_from_forward from %s. Chat type: %s", message.from_user.id, message.chat.type)
 
+    if message.chat.type in ['group', 'supergroup', 'channel']:
+        await db.add_chat(message.chat.id, message.chat.title or "Без названия", message.chat.type)
 
     if message.forward_from_chat:
         chat_id = message.forward_from_chat.id
@@ -312,7 +632,7 @@ async def get_chat_id_from_forward(message: types.Message):
             f"Тип: {chat_type}"
         )
         await message.answer(response)
-        logging.info(f"Successfully identified forwarded chat ID: {chat_id}")
+        logging.info("Successfully identified forwarded chat ID: %s", chat_id)
         return 
     if message.text == "/get_chat_id_debug":
         if message.chat.type in ['group', 'supergroup', 'channel']:
@@ -322,70 +642,166 @@ async def get_chat_id_from_forward(message: types.Message):
         return
 
 
-@dp.message()
+@dp.message(is_vote)
 async def handle_karma(message: types.Message):
-    logging.info(f"Received message in handle_karma: {message.text} from {message.from_user.full_name} in chat {message.chat.title if message.chat.title else message.chat.type} (ID: {message.chat.id})")
-
-    logging.info(f"Received message: {message.text}")
-    logging.info(f"Chat type: {message.chat.type}")
-    logging.info(f"Is reply: {bool(message.reply_to_message)}")
-
-    # logging.info(f"Is chat admin: {is_chat_admin_status}")
-    # logging.info(f"Is bot admin: {is_bot_admin_status}")
-
-    logging.info(f"Message text stripped: '{message.text.strip()}'")
+    if message.chat.type not in ['group', 'supergroup'] or not message.reply_to_message:
+        logging.debug("Vote ignored in chat %s: not a group chat or not a reply.", message.chat.id)
+        return
 
+    target_user = message.reply_to_message.from_user
+    if target_user.is_bot:
+        logging.debug("Vote ignored in chat %s: target %s is a bot.", message.chat.id, target_user.id)
+        return
 
-    
-    if message.chat.type not in ['group', 'supergroup'] or not message.reply_to_message:
-        logging.info("Conditions not met: Not a group chat or not a reply.")
+    vote = (message.chat.id, message.reply_to_message.message_id, message.from_user.id, target_user.id)
+    rejected = throttle.check(*vote)
+    if rejected:
+        metrics.votes.inc(rejected)
+        logging.debug("Vote ignored in chat %s: sender %s throttled (%s).", message.chat.id, message.from_user.id, rejected)
         return
 
-    is_chat_admin_status = await check_group_admin(message.from_user.id, message.chat.id)
     is_bot_admin_status = await db.is_admin(message.from_user.id, message.chat.id)
-    logging.info(f"Sender {message.from_user.full_name} (ID: {message.from_user.id}) - is_chat_admin: {is_chat_admin_status}, is_bot_admin: {is_bot_admin_status}")
-
+    is_chat_admin_status = is_bot_admin_status or await check_group_admin(message.from_user.id, message.chat.id)
     if not (is_chat_admin_status or is_bot_admin_status):
-        logging.info("Sender is not an authorized admin.")
+        logging.debug("Vote ignored in chat %s: sender %s is not an authorized admin.", message.chat.id, message.from_user.id)
         return
 
-    target_user = message.reply_to_message.from_user
-    logging.info(f"Target user: {target_user.full_name} (ID: {target_user.id})")
-
-    if target_user.is_bot:
-        logging.info("Target is a bot, skipping.")
-        return
     if target_user.id == message.from_user.id:
-        logging.info("Target is sender, skipping (self-karma).")
-        await message.reply("Нельзя ставить баллы самому себе.")
+        logging.debug("Vote ignored in chat %s: sender %s voted for themselves.", message.chat.id, target_user.id)
+        outbox.send(message.chat.id, "Нельзя ставить баллы самому себе.", reply_to=message.message_id)
         return
 
-    score_change = 0
-    if message.text.strip() == "+1":
-        score_change = 1
-    elif message.text.strip() == "-1":
-        score_change = -1
-    
-    logging.info(f"Score change: {score_change}")
-
-    if score_change != 0:
-        await db.update_user_score(target_user.id, message.chat.id, score_change)
-        await db.log_activity(message.chat.id, message.from_user.id, target_user.id, score_change)
-        current_score = await db.get_user_score(target_user.id, message.chat.id)
-        await message.reply(f"Баллы пользователя {target_user.full_name} изменены. Текущие баллы: {current_score}")
-    else:
-        logging.info("Message text is not +1 or -1.")
+    # Checked again after the awaits above, this time recording the vote atomically.
+    rejected = throttle.acquire(*vote)
+    if rejected:
+        metrics.votes.inc(rejected)
+        logging.debug("Vote ignored in chat %s: sender %s throttled (%s).", message.chat.id, message.from_user.id, rejected)
+        return
 
+    score_change = parse_vote(message.text)
+    current_score = await db.update_user_score(target_user.id, message.chat.id, score_change)
+    await db.log_activity(message.chat.id, message.from_user.id, target_user.id, score_change)
+    metrics.votes.inc('accepted')
+    logging.info("Vote %+d from %s to %s in chat %s, score now %s",
+                 score_change, message.from_user.id, target_user.id, message.chat.id, current_score,
+                 extra={'chat_id': message.chat.id, 'giver_id': message.from_user.id,
+                        'receiver_id': target_user.id, 'score_change': score_change, 'score': current_score})
+    outbox.confirm_vote(message.chat.id, message.message_id, target_user.id, target_user.full_name,
+                        message.from_user.id, score_change, current_score)
+
+is_leader = not SHARED_STATE
+
+async def renew_leadership():
+    global is_leader
+    was_leader = is_leader
+    is_leader = await db.acquire_lease('scheduler', WORKER_ID, LEADER_LEASE_TTL)
+    if is_leader != was_leader:
+        logging.info("Worker %s %s scheduler leadership.", WORKER_ID, 'acquired' if is_leader else 'lost')
+    if is_leader:
+        await db.prune_invalidations()
+
+def leader_only(job):
+    @functools.wraps(job)
+    async def wrapper():
+        if is_leader:
+            await job()
+    return wrapper
+
+def recorded(job):
+    @functools.wraps(job)
+    async def wrapper():
+        await job()
+        await db.record_job_run(job.__name__, time.time())
+    return wrapper
+
+async def catch_up_missed_jobs(cron_jobs):
+    last_runs = await db.get_job_runs()
+    now = datetime.now(scheduler.timezone)
+    for job, trigger in cron_jobs:
+        last_run = last_runs.get(job.__name__)
+        if last_run is None:
+            # A job seen for the first time has missed nothing; its schedule starts now.
+            await db.record_job_run(job.__name__, now.timestamp())
+            continue
+        previous = datetime.fromtimestamp(last_run, scheduler.timezone)
+        due = trigger.get_next_fire_time(None, previous)
+        if due is not None and due <= now:
+            logging.info("Scheduling %s, missed since %s.", job.__name__, previous)
+            scheduler.add_job(job, next_run_time=now)
+
+@leader_only
+@recorded
 async def monthly_karma_reset():
     logging.info("Checking for monthly scores reset...")
     await db.reset_monthly_karma_if_needed()
     logging.info("Monthly scores reset check finished.")
 
-async def main():
-    scheduler.add_job(monthly_karma_reset, 'cron', hour=0, minute=1)
+@leader_only
+@recorded
+async def activity_log_compaction():
+    logging.info("Compacting activity log...")
+    archived = await db.compact_activity_log(ACTIVITY_RETENTION_DAYS, ACTIVITY_ARCHIVE_DIR, COMPACTION_BATCH_SIZE)
+    logging.info("Activity log compaction finished: %s rows archived.", archived)
+
+@dp.startup()
+async def on_startup():
+    global metrics_runner, scheduler
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.cron import CronTrigger
+
+    # A run delayed by a blocked loop still fires once instead of being dropped or repeated.
+    scheduler = AsyncIOScheduler(job_defaults={'coalesce': True, 'misfire_grace_time': 3600})
+    if METRICS_PORT:
+        try:
+            metrics_runner = await metrics.start_server(METRICS_HOST, METRICS_PORT)
+            logging.info("Metrics exposed at http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            # Metrics are optional; another instance on this host may already hold the port.
+            logging.error("Metrics endpoint disabled, cannot bind %s:%s: %s", METRICS_HOST, METRICS_PORT, e)
+    await db.open()
+    if isinstance(fsm_storage, DatabaseStorage):
+        await fsm_storage.load()
+    await throttle.load()
+    if SHARED_STATE:
+        await renew_leadership()
+        scheduler.add_job(renew_leadership, 'interval', seconds=LEADER_LEASE_TTL / 3)
+        scheduler.add_job(db.sync_shared_state, 'interval', seconds=SHARED_STATE_SYNC_SECONDS)
+    scheduler.add_job(throttle.persist, 'interval', seconds=VOTE_THROTTLE_PERSIST_SECONDS)
+    cron_jobs = [(monthly_karma_reset, CronTrigger(hour=0, minute=1, timezone=scheduler.timezone))]
+    if ACTIVITY_RETENTION_DAYS > 0:
+        cron_jobs.append((activity_log_compaction, CronTrigger(hour=0, minute=30, timezone=scheduler.timezone)))
+    for job, trigger in cron_jobs:
+        scheduler.add_job(job, trigger)
+    # Runs missed while the bot was down are replayed once in the background; last runs live in job_runs.
+    await catch_up_missed_jobs(cron_jobs)
     scheduler.start()
 
-    await dp.start_polling(bot)
+    if BOT_MODE == 'webhook' and WEBHOOK_BASE_URL:
+        await bot.set_webhook(WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                              allowed_updates=dp.resolve_used_update_types())
+        logging.info("Webhook registered at %s", WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH)
+
+@dp.shutdown()
+async def on_shutdown():
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+    await outbox.close()
+    await throttle.persist()
+    await db.close()
+    logging.info("Pending writes flushed, database closed.")
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+def create_webhook_app() -> web.Application:
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def main():
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 if __name__ == "__main__":
     if not BOT_TOKEN:
@@ -399,7 +815,13 @@ if __name__ == "__main__":
     try:
         SUPER_ADMIN_ID = int(SUPER_ADMIN_ID_ENV)
     except ValueError:
-        logging.error(f"SUPER_ADMIN_ID '{SUPER_ADMIN_ID_ENV}' is not a valid integer!")
+        logging.error("SUPER_ADMIN_ID '%s' is not a valid integer!", SUPER_ADMIN_ID_ENV)
         exit(1)
 
-    asyncio.run(main())
\ No newline at end of file
+    if BOT_MODE == 'webhook':
+        if not WEBHOOK_SECRET:
+            logging.error("WEBHOOK_SECRET must be set in webhook mode; without it anyone can post forged updates.")
+            exit(1)
+        web.run_app(create_webhook_app(), host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    else:
+        asyncio.run(main())
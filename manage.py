@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import json
+import sqlite3
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import (DB_BACKEND, DB_NAME, DATABASE_URL, ACTIVITY_RETENTION_DAYS, ACTIVITY_ARCHIVE_DIR,
+                    COMPACTION_BATCH_SIZE, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    VOTE_GIVER_COOLDOWN, VOTE_RECEIVER_COOLDOWN, VOTE_DAILY_CAP, LOG_LEVEL, LOG_FORMAT)
+from logs import setup_logging
+from storage import create_database
+
+MIGRATED_TABLES = {
+    'users': ('user_id', 'chat_id', 'score', 'last_activity_month'),
+    'admins': ('user_id', 'chat_id'),
+    'chats': ('chat_id', 'chat_name', 'chat_type'),
+    'activity_log': ('chat_id', 'giver_id', 'receiver_id', 'score_change', 'timestamp'),
+    'user_names': ('user_id', 'full_name'),
+    'monthly_scores': ('chat_id', 'month', 'user_id', 'score'),
+    'vote_policies': ('chat_id', 'giver_cooldown', 'receiver_cooldown', 'daily_cap'),
+    # Rollups are copied too: days whose raw rows were already compacted cannot be rebuilt.
+    'activity_daily': ('chat_id', 'day', 'plus_count', 'minus_count', 'net', 'givers'),
+    'activity_daily_givers': ('chat_id', 'day', 'giver_id'),
+}
+
+
+async def open_database(args):
+    db = create_database(DB_BACKEND, sqlite_path=args.db, postgres_dsn=DATABASE_URL)
+    await db.open()
+    return db
+
+
+async def migrate_schema(args):
+    db = await open_database(args)
+    try:
+        if await db.enable_incremental_vacuum():
+            print("Switched the database to incremental auto_vacuum.")
+    finally:
+        await db.close()
+    print("Database schema is up to date.")
+
+
+async def backfill_rollup(args):
+    db = await open_database(args)
+    try:
+        days = await db.rebuild_daily_rollup()
+        print(f"Rebuilt {days} chat-days of activity rollups.")
+    finally:
+        await db.close()
+
+
+async def compact(args):
+    db = await open_database(args)
+    try:
+        archived = await db.compact_activity_log(args.retention_days, args.archive_dir, COMPACTION_BATCH_SIZE)
+        print(f"Archived {archived} activity_log rows into {args.archive_dir}.")
+        if await db.enable_incremental_vacuum():
+            print("Switched the database to incremental auto_vacuum.")
+    finally:
+        await db.close()
+
+
+async def set_vote_policy(args):
+    db = await open_database(args)
+    try:
+        await db.set_vote_policy(args.chat_id, args.giver_cooldown, args.receiver_cooldown, args.daily_cap)
+        print(f"Vote policy for chat {args.chat_id} saved; running bots pick it up on their next throttle sync.")
+    finally:
+        await db.close()
+
+
+async def post_updates(args):
+    from aiohttp import ClientSession
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+    sent = 0
+    async with ClientSession(headers=headers) as session:
+        with open(args.file, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                async with session.post(args.url, json=json.loads(line)) as response:
+                    if response.status != 200:
+                        print(f"Update rejected with HTTP {response.status}: {line.strip()[:80]}")
+                        continue
+                sent += 1
+    print(f"Delivered {sent} updates to {args.url}.")
+
+
+async def migrate_to_postgres(args):
+    from pg import PostgresDatabase
+
+    target = PostgresDatabase(args.dsn)
+    await target.open()
+    source = sqlite3.connect(args.db)
+    try:
+        for table in MIGRATED_TABLES:
+            if await target.pool.fetchval(f'SELECT COUNT(*) FROM {table}'):
+                raise SystemExit(f"Table {table} in the target database is not empty; refusing to migrate.")
+
+        for table, columns in MIGRATED_TABLES.items():
+            cursor = source.execute(f'SELECT {", ".join(columns)} FROM {table}')
+            copied = 0
+            while True:
+                chunk = cursor.fetchmany(args.chunk_size)
+                if not chunk:
+                    break
+                if table == 'activity_log':
+                    chunk = target._activity_params(chunk)
+                await target.copy_records(table, columns, chunk)
+                copied += len(chunk)
+            print(f"{table}: copied {copied} rows")
+
+        days = await target.rebuild_daily_rollup()
+        print(f"Rebuilt {days} chat-days of activity rollups.")
+    finally:
+        source.close()
+        await target.close()
+
+
+def main():
+    setup_logging(LOG_LEVEL, LOG_FORMAT)
+    parser = argparse.ArgumentParser(description="Maintenance commands for the karma bot database.")
+    parser.add_argument('--db', default=DB_NAME, help="SQLite database file (default: DB_NAME)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('migrate', help="Apply pending schema migrations and exit.").set_defaults(func=migrate_schema)
+
+    commands.add_parser('backfill-rollup', help="Rebuild daily activity rollups from activity_log.").set_defaults(func=backfill_rollup)
+
+    compact_parser = commands.add_parser('compact', help="Archive old activity_log rows and reclaim free pages.")
+    compact_parser.add_argument('--retention-days', type=int, default=ACTIVITY_RETENTION_DAYS)
+    compact_parser.add_argument('--archive-dir', default=ACTIVITY_ARCHIVE_DIR)
+    compact_parser.set_defaults(func=compact)
+
+    policy_parser = commands.add_parser('set-vote-policy', help="Override vote throttling limits for one chat.")
+    policy_parser.add_argument('chat_id', type=int)
+    policy_parser.add_argument('--giver-cooldown', type=float, default=VOTE_GIVER_COOLDOWN)
+    policy_parser.add_argument('--receiver-cooldown', type=float, default=VOTE_RECEIVER_COOLDOWN)
+    policy_parser.add_argument('--daily-cap', type=int, default=VOTE_DAILY_CAP, help="0 disables the cap.")
+    policy_parser.set_defaults(func=set_vote_policy)
+
+    migrate_parser = commands.add_parser('migrate-to-postgres', help="Bulk-copy the SQLite database into an empty PostgreSQL database.")
+    migrate_parser.add_argument('--dsn', default=DATABASE_URL)
+    migrate_parser.add_argument('--chunk-size', type=int, default=10000)
+    migrate_parser.set_defaults(func=migrate_to_postgres)
+
+    post_parser = commands.add_parser('post-updates', help="POST recorded updates (one JSON object per line) to a local webhook.")
+    post_parser.add_argument('file')
+    post_parser.add_argument('--url', default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    post_parser.add_argument('--secret', default=WEBHOOK_SECRET)
+    post_parser.set_defaults(func=post_updates)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import functools
+import inspect
+import time
+from bisect import bisect_left
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REGISTRY = []
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        # Per-bucket counts are stored non-cumulatively and summed only when scraped.
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ('le',)
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+update_latency = Histogram('karma_update_duration_seconds', "End-to-end update processing time.", ['update_type'])
+handler_latency = Histogram('karma_handler_duration_seconds', "Handler execution time.", ['handler'])
+db_latency = Histogram('karma_db_call_duration_seconds', "Database method call time.", ['method'])
+api_latency = Histogram('karma_bot_api_call_duration_seconds', "Telegram Bot API call time.", ['method'])
+errors = Counter('karma_errors_total', "Exceptions raised, by component and name.", ['component', 'name'])
+votes = Counter('karma_votes_total', "Vote attempts by outcome.", ['result'])
+
+
+def render() -> str:
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            errors.inc('update', type(e).__name__)
+            raise
+        finally:
+            update_latency.observe(time.perf_counter() - started, event.event_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        name = data['handler'].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            errors.inc('handler', name)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - started, name)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            errors.inc('bot_api', f"{name}:{type(e).__name__}")
+            raise
+        finally:
+            api_latency.observe(time.perf_counter() - started, name)
+
+
+def instrument_database(db):
+    for name, method in inspect.getmembers(db, inspect.iscoroutinefunction):
+        if not name.startswith('_'):
+            setattr(db, name, _timed_db_call(name, method))
+
+
+def _timed_db_call(name: str, method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception as e:
+            errors.inc('db', f"{name}:{type(e).__name__}")
+            raise
+        finally:
+            db_latency.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def setup(dp, bot, db):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for observer in (dp.message, dp.callback_query, dp.chat_member):
+        observer.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(BotApiMetricsMiddleware())
+    instrument_database(db)
+
+
+async def _serve_metrics(request):
+    return web.Response(body=render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+async def start_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/metrics', _serve_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    return runner
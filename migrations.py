@@ -0,0 +1,235 @@
+import logging
+
+
+def create_baseline(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            score INTEGER DEFAULT 0,
+            last_activity_month TEXT,
+            PRIMARY KEY (user_id, chat_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS admins (
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, chat_id)
+        )
+    ''')
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY,
+            chat_name TEXT,
+            chat_type TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_log (
+            chat_id INTEGER,
+            giver_id INTEGER,
+            receiver_id INTEGER,
+            score_change INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_names (
+            user_id INTEGER PRIMARY KEY,
+            full_name TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            chat_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            plus_count INTEGER NOT NULL DEFAULT 0,
+            minus_count INTEGER NOT NULL DEFAULT 0,
+            net INTEGER NOT NULL DEFAULT 0,
+            givers INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chat_id, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_daily_givers (
+            chat_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            giver_id INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, day, giver_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cache_invalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scope TEXT NOT NULL,
+            chat_id INTEGER,
+            created_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS monthly_scores (
+            chat_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, month, user_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vote_marks (
+            chat_id INTEGER NOT NULL,
+            giver_id INTEGER NOT NULL,
+            receiver_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            voted_at REAL NOT NULL
+        )
+    """)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vote_marks_time ON vote_marks (voted_at)')
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vote_policies (
+            chat_id INTEGER PRIMARY KEY,
+            giver_cooldown REAL NOT NULL,
+            receiver_cooldown REAL NOT NULL,
+            daily_cap INTEGER NOT NULL
+        )
+    """)
+
+
+def add_activity_log_primary_key(cursor):
+    # SQLite cannot add a primary key in place. The new id aliases the rowid and keeps its values,
+    # so rows already copied into the monthly archives still match their source_rowid.
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(activity_log)')]
+    if 'id' in columns:
+        return
+    cursor.execute("""
+        CREATE TABLE activity_log_new (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER,
+            giver_id INTEGER,
+            receiver_id INTEGER,
+            score_change INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO activity_log_new (id, chat_id, giver_id, receiver_id, score_change, timestamp)
+        SELECT rowid, chat_id, giver_id, receiver_id, score_change, timestamp FROM activity_log
+    """)
+    cursor.execute('DROP TABLE activity_log')
+    cursor.execute('ALTER TABLE activity_log_new RENAME TO activity_log')
+
+
+def add_hot_path_indexes(cursor):
+    # user_id is included so loading a chat's leaderboard is answered from the index alone.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_chat_score ON users (chat_id, score DESC, user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activity_log_chat_time ON activity_log (chat_id, timestamp)')
+
+
+def add_chat_search(cursor):
+    # External-content FTS5 index over chats.chat_name (chat_id is the rowid), kept in sync by triggers.
+    cursor.execute("""
+        CREATE VIRTUAL TABLE chats_fts USING fts5(
+            chat_name, content='chats', content_rowid='chat_id', tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER chats_fts_insert AFTER INSERT ON chats BEGIN
+            INSERT INTO chats_fts (rowid, chat_name) VALUES (new.chat_id, new.chat_name);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER chats_fts_delete AFTER DELETE ON chats BEGIN
+            INSERT INTO chats_fts (chats_fts, rowid, chat_name) VALUES ('delete', old.chat_id, old.chat_name);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER chats_fts_update AFTER UPDATE OF chat_name ON chats BEGIN
+            INSERT INTO chats_fts (chats_fts, rowid, chat_name) VALUES ('delete', old.chat_id, old.chat_name);
+            INSERT INTO chats_fts (rowid, chat_name) VALUES (new.chat_id, new.chat_name);
+        END
+    """)
+    cursor.execute("INSERT INTO chats_fts (chats_fts) VALUES ('rebuild')")
+
+
+def add_job_runs(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            name TEXT PRIMARY KEY,
+            last_run_at REAL NOT NULL
+        )
+    """)
+
+
+def rebuild_daily_rollup(cursor) -> int:
+    # Only days that still have raw rows are rebuilt, so rollups of compacted history survive.
+    cursor.execute('''
+        CREATE TEMP TABLE rollup_days AS
+        SELECT DISTINCT chat_id, substr(timestamp, 1, 10) AS day FROM activity_log
+    ''')
+    try:
+        cursor.execute('DELETE FROM activity_daily WHERE (chat_id, day) IN (SELECT chat_id, day FROM rollup_days)')
+        cursor.execute('DELETE FROM activity_daily_givers WHERE (chat_id, day) IN (SELECT chat_id, day FROM rollup_days)')
+        cursor.execute('''
+            INSERT INTO activity_daily_givers (chat_id, day, giver_id)
+            SELECT DISTINCT chat_id, substr(timestamp, 1, 10), giver_id FROM activity_log
+        ''')
+        cursor.execute('''
+            INSERT INTO activity_daily (chat_id, day, plus_count, minus_count, net, givers)
+            SELECT chat_id, substr(timestamp, 1, 10) AS day,
+                   SUM(score_change > 0), SUM(score_change < 0), SUM(score_change), COUNT(DISTINCT giver_id)
+            FROM activity_log
+            GROUP BY chat_id, day
+        ''')
+        return cursor.rowcount
+    finally:
+        cursor.execute('DROP TABLE rollup_days')
+
+
+# Append only: a database at user_version N has had the first N migrations applied.
+MIGRATIONS = [
+    ('baseline schema', create_baseline),
+    ('activity_log primary key', add_activity_log_primary_key),
+    ('hot-path indexes', add_hot_path_indexes),
+    ('chat name search', add_chat_search),
+    ('scheduled job runs', add_job_runs),
+    # Fills the rollup tables from existing history, replacing "manage.py backfill-rollup" after upgrades.
+    ('activity rollup backfill', rebuild_daily_rollup),
+]
+
+
+def migrate(conn) -> int:
+    while True:
+        # BEGIN IMMEDIATE takes the write lock first, so workers starting together migrate one at a time.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > len(MIGRATIONS):
+                raise RuntimeError(f"Database schema version {version} is newer than this code ({len(MIGRATIONS)}).")
+            if version == len(MIGRATIONS):
+                conn.rollback()
+                return version
+            name, migration = MIGRATIONS[version]
+            logging.info("Applying database migration %s: %s", version + 1, name)
+            cursor = conn.cursor()
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {version + 1}')
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
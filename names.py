@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+
+class NameCache:
+    def __init__(self, bot, db, capacity: int = 10000, concurrency: int = 5):
+        self.bot = bot
+        self.db = db
+        self.capacity = capacity
+        self.concurrency = concurrency
+        self._names = OrderedDict()
+
+    def _store(self, user_id: int, full_name: str):
+        self._names[user_id] = full_name
+        self._names.move_to_end(user_id)
+        if len(self._names) > self.capacity:
+            self._names.popitem(last=False)
+
+    def remember(self, user):
+        if user is None or user.is_bot:
+            return
+        if self._names.get(user.id) != user.full_name:
+            self.db.queue_user_name(user.id, user.full_name)
+        self._store(user.id, user.full_name)
+
+    async def resolve(self, chat_id: int, user_ids) -> dict:
+        names = {}
+        missing = []
+        for user_id in user_ids:
+            if user_id in self._names:
+                self._names.move_to_end(user_id)
+                names[user_id] = self._names[user_id]
+            else:
+                missing.append(user_id)
+
+        if missing:
+            for user_id, full_name in (await self.db.get_user_names(missing)).items():
+                self._store(user_id, full_name)
+                names[user_id] = full_name
+            missing = [user_id for user_id in missing if user_id not in names]
+
+        if missing:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetch(user_id):
+                async with semaphore:
+                    try:
+                        member = await self.bot.get_chat_member(chat_id, user_id)
+                    except Exception as e:
+                        logging.error("Error getting chat member for %s in %s: %s", user_id, chat_id, e)
+                        return
+                    if member.user.full_name:
+                        self.remember(member.user)
+                        names[user_id] = member.user.full_name
+
+            await asyncio.gather(*(fetch(user_id) for user_id in missing))
+        return names
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.types import ReplyParameters
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class VoteConfirmation:
+    def __init__(self, chat_id: int, reply_to: int, target_name: str):
+        self.chat_id = chat_id
+        self.reply_to = reply_to
+        self.target_name = target_name
+        self.total = 0
+        self.givers = set()
+        self.score = None
+        self.message_id = None
+        self.expires_at = None
+        self.dirty = False
+        self.task = None
+
+    def add(self, giver_id: int, score_change: int, score: int):
+        self.total += score_change
+        self.givers.add(giver_id)
+        self.score = score
+        self.dirty = True
+
+    def take_text(self) -> str:
+        # Rendered only once a send slot is granted, so the message carries every vote seen so far.
+        self.dirty = False
+        return self.text()
+
+    def text(self) -> str:
+        if len(self.givers) == 1 and self.message_id is None and abs(self.total) == 1:
+            return f"Баллы пользователя {self.target_name} изменены. Текущие баллы: {self.score}"
+        count = len(self.givers)
+        admins = "админа" if count % 10 == 1 and count % 100 != 11 else "админов"
+        return f"Баллы пользователя {self.target_name}: {self.total:+d} от {count} {admins}, теперь {self.score}"
+
+
+class Outbox:
+    def __init__(self, bot, chat_rate_per_minute: float = 20, chat_burst: int = 3, global_rate: float = 30,
+                 coalesce_window: float = 10, max_retries: int = 3):
+        self.bot = bot
+        self.chat_rate = chat_rate_per_minute / 60
+        self.chat_burst = chat_burst
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets = {}
+        self._confirmations = {}
+        self._tasks = set()
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _call(self, chat_id: int, method):
+        bucket = self._bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                return await method()
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("Flood control in chat %s, retrying in %ss.", chat_id, e.retry_after)
+                bucket.pause(e.retry_after)
+
+    def send(self, chat_id: int, text: str, reply_to: int = None):
+        reply_parameters = ReplyParameters(message_id=reply_to, allow_sending_without_reply=True) if reply_to else None
+        self._spawn(self._send(chat_id, text, reply_parameters))
+
+    async def _send(self, chat_id: int, text: str, reply_parameters):
+        try:
+            await self._call(chat_id, lambda: self.bot.send_message(chat_id, text, reply_parameters=reply_parameters))
+        except TelegramAPIError as e:
+            logging.error("Error sending message to chat %s: %s", chat_id, e)
+
+    def confirm_vote(self, chat_id: int, reply_to: int, target_id: int, target_name: str,
+                     giver_id: int, score_change: int, score: int):
+        key = (chat_id, target_id)
+        entry = self._confirmations.get(key)
+        if entry is None or (entry.expires_at is not None and entry.expires_at <= time.monotonic()):
+            entry = self._confirmations[key] = VoteConfirmation(chat_id, reply_to, target_name)
+        entry.add(giver_id, score_change, score)
+        if entry.task is None:
+            entry.task = self._spawn(self._deliver(key, entry))
+
+    async def _deliver(self, key, entry: VoteConfirmation):
+        # Votes that arrive while this task waits for a token are folded into the same message.
+        try:
+            while entry.dirty:
+                if entry.message_id is None:
+                    message = await self._call(entry.chat_id, lambda: self.bot.send_message(
+                        entry.chat_id, entry.take_text(),
+                        reply_parameters=ReplyParameters(message_id=entry.reply_to, allow_sending_without_reply=True)))
+                    entry.message_id = message.message_id
+                    entry.expires_at = time.monotonic() + self.coalesce_window
+                else:
+                    await self._call(entry.chat_id, lambda: self.bot.edit_message_text(
+                        entry.take_text(), chat_id=entry.chat_id, message_id=entry.message_id))
+        except TelegramAPIError as e:
+            logging.error("Error delivering vote confirmation to chat %s: %s", entry.chat_id, e)
+            if self._confirmations.get(key) is entry:
+                del self._confirmations[key]
+            return
+        finally:
+            entry.task = None
+        asyncio.get_running_loop().call_later(self.coalesce_window, self._expire, key, entry)
+
+    def _expire(self, key, entry: VoteConfirmation):
+        if self._confirmations.get(key) is entry and entry.task is None:
+            del self._confirmations[key]
+
+    async def close(self, timeout: float = 5):
+        if self._tasks:
+            done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
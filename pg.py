@@ -0,0 +1,258 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from storage import Storage
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        score INTEGER DEFAULT 0,
+        last_activity_month TEXT,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_users_chat_score ON users (chat_id, score DESC, user_id)',
+    '''
+    CREATE TABLE IF NOT EXISTS admins (
+        user_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        PRIMARY KEY (user_id, chat_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS chats (
+        chat_id BIGINT PRIMARY KEY,
+        chat_name TEXT,
+        chat_type TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS activity_log (
+        id BIGSERIAL PRIMARY KEY,
+        chat_id BIGINT,
+        giver_id BIGINT,
+        receiver_id BIGINT,
+        score_change INTEGER,
+        timestamp TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_activity_log_chat_time ON activity_log (chat_id, timestamp)',
+    '''
+    CREATE TABLE IF NOT EXISTS activity_log_archive (
+        id BIGINT PRIMARY KEY,
+        chat_id BIGINT,
+        giver_id BIGINT,
+        receiver_id BIGINT,
+        score_change INTEGER,
+        timestamp TIMESTAMP NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_names (
+        user_id BIGINT PRIMARY KEY,
+        full_name TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS activity_daily (
+        chat_id BIGINT NOT NULL,
+        day TEXT NOT NULL,
+        plus_count INTEGER NOT NULL DEFAULT 0,
+        minus_count INTEGER NOT NULL DEFAULT 0,
+        net INTEGER NOT NULL DEFAULT 0,
+        givers INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (chat_id, day)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS activity_daily_givers (
+        chat_id BIGINT NOT NULL,
+        day TEXT NOT NULL,
+        giver_id BIGINT NOT NULL,
+        PRIMARY KEY (chat_id, day, giver_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS fsm_state (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at DOUBLE PRECISION NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+        id BIGSERIAL PRIMARY KEY,
+        scope TEXT NOT NULL,
+        chat_id BIGINT,
+        created_at DOUBLE PRECISION NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS monthly_scores (
+        chat_id BIGINT NOT NULL,
+        month TEXT NOT NULL,
+        user_id BIGINT NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, month, user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS vote_marks (
+        chat_id BIGINT NOT NULL,
+        giver_id BIGINT NOT NULL,
+        receiver_id BIGINT NOT NULL,
+        message_id BIGINT NOT NULL,
+        voted_at DOUBLE PRECISION NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_vote_marks_time ON vote_marks (voted_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS vote_policies (
+        chat_id BIGINT PRIMARY KEY,
+        giver_cooldown DOUBLE PRECISION NOT NULL,
+        receiver_cooldown DOUBLE PRECISION NOT NULL,
+        daily_cap INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS job_runs (
+        name TEXT PRIMARY KEY,
+        last_run_at DOUBLE PRECISION NOT NULL
+    )
+    ''',
+]
+
+
+def _rowcount(status: str) -> int:
+    # asyncpg returns command tags such as "UPDATE 3" or "INSERT 0 1".
+    parts = status.split()
+    return int(parts[-1]) if parts and parts[-1].isdigit() else 0
+
+
+class PostgresDatabase(Storage):
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10, **options):
+        super().__init__(**options)
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+        self._queries = {}
+
+    def _sql(self, query: str) -> str:
+        converted = self._queries.get(query)
+        if converted is None:
+            parts = query.split('?')
+            converted = parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], start=1))
+            self._queries[query] = converted
+        return converted
+
+    async def _create_schema(self):
+        try:
+            import asyncpg
+        except ImportError as e:
+            raise RuntimeError("DB_BACKEND=postgres requires the asyncpg package (pip install asyncpg)") from e
+
+        # asyncpg prepares and caches every statement per connection (statement_cache_size).
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+
+    async def _execute(self, query: str, params: tuple = ()) -> int:
+        return _rowcount(await self.pool.execute(self._sql(query), *params))
+
+    async def _transaction_returning(self, statements):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for query, params in statements[:-1]:
+                    await conn.execute(self._sql(query), *params)
+                query, params = statements[-1]
+                return await conn.fetchrow(self._sql(query), *params)
+
+    async def _fetchone(self, query: str, params: tuple = ()):
+        return await self.pool.fetchrow(self._sql(query), *params)
+
+    async def _fetchall(self, query: str, params: tuple = ()):
+        return await self.pool.fetch(self._sql(query), *params)
+
+    async def _transaction(self, statements) -> list:
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                return [_rowcount(await conn.execute(self._sql(query), *params)) for query, params in statements]
+
+    async def _executemany(self, batches):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for query, rows in batches:
+                    if rows:
+                        await conn.executemany(self._sql(query), rows)
+
+    def _activity_params(self, rows):
+        return [(chat_id, giver_id, receiver_id, score_change, datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+                for chat_id, giver_id, receiver_id, score_change, timestamp in rows]
+
+    def _day_start(self, day: str):
+        return datetime.strptime(day, '%Y-%m-%d')
+
+    async def _close_backend(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def rebuild_daily_rollup(self) -> int:
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # Only days that still have raw rows are rebuilt, so rollups of compacted history survive.
+                await conn.execute('''
+                    CREATE TEMP TABLE rollup_days ON COMMIT DROP AS
+                    SELECT DISTINCT chat_id, to_char(timestamp, 'YYYY-MM-DD') AS day FROM activity_log
+                ''')
+                await conn.execute('DELETE FROM activity_daily d USING rollup_days r WHERE d.chat_id = r.chat_id AND d.day = r.day')
+                await conn.execute('DELETE FROM activity_daily_givers d USING rollup_days r WHERE d.chat_id = r.chat_id AND d.day = r.day')
+                await conn.execute('''
+                    INSERT INTO activity_daily_givers (chat_id, day, giver_id)
+                    SELECT DISTINCT chat_id, to_char(timestamp, 'YYYY-MM-DD'), giver_id FROM activity_log
+                ''')
+                status = await conn.execute('''
+                    INSERT INTO activity_daily (chat_id, day, plus_count, minus_count, net, givers)
+                    SELECT chat_id, to_char(timestamp, 'YYYY-MM-DD') AS day,
+                           COUNT(*) FILTER (WHERE score_change > 0), COUNT(*) FILTER (WHERE score_change < 0),
+                           SUM(score_change), COUNT(DISTINCT giver_id)
+                    FROM activity_log
+                    GROUP BY chat_id, day
+                ''')
+                return _rowcount(status)
+
+    async def compact_activity_log(self, retention_days: int, archive_dir: str, batch_size: int = 5000) -> int:
+        # PostgreSQL keeps expired rows in activity_log_archive instead of per-month files; autovacuum reclaims space.
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).replace(
+            hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        archived = 0
+        while True:
+            moved = _rowcount(await self.pool.execute('''
+                WITH moved AS (
+                    DELETE FROM activity_log
+                    WHERE id IN (SELECT id FROM activity_log WHERE timestamp < $1 ORDER BY id LIMIT $2)
+                    RETURNING id, chat_id, giver_id, receiver_id, score_change, timestamp
+                )
+                INSERT INTO activity_log_archive SELECT * FROM moved ON CONFLICT DO NOTHING
+            ''', cutoff, batch_size))
+            archived += moved
+            if moved < batch_size:
+                break
+        logging.info("Archived %s activity_log rows into activity_log_archive.", archived)
+        return archived
+
+    async def copy_records(self, table: str, columns, records):
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table(table, records=records, columns=list(columns))
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import DATABASE_URL, LOG_LEVEL, LOG_FORMAT
+from logs import setup_logging
+
+CHAT = -1001
+OTHER_CHAT = -1002
+
+
+def with_database(dsn: str, name: str) -> str:
+    parts = urlsplit(dsn)
+    return urlunsplit(parts._replace(path='/' + name))
+
+
+async def check_storage(db):
+    await db.add_chat(CHAT, "Smoke chat", 'supergroup')
+    await db.add_chat(OTHER_CHAT, "Другой чат", 'group')
+    assert [row[0] for row in await db.search_chats("smoke", 10)] == [CHAT]
+    assert (await db.get_chats_page(1))[0] == [(OTHER_CHAT, "Другой чат")]
+
+    assert await db.add_admins([1, 2], [CHAT, OTHER_CHAT]) == 4
+    assert await db.remove_admins([2], [OTHER_CHAT]) == 1
+    assert await db.get_chat_admins(OTHER_CHAT) == [1]
+
+    for user_id, change in ((10, 3), (11, 5), (10, 1), (12, -2)):
+        await db.update_user_score(user_id, CHAT, change)
+        await db.log_activity(CHAT, 1, user_id, change)
+    await db.flush()
+    assert await db.get_top_users(CHAT, 2) == [(11, 5), (10, 4)]
+    assert await db.get_user_rank(10, CHAT) == (2, 3)
+
+    assert await db.rebuild_daily_rollup() == 1
+    today = datetime.now(timezone.utc)
+    assert await db.get_activity_version(CHAT, today.year, today.month) == 4
+    since = (today - timedelta(days=1)).strftime('%Y-%m-%d')
+    dashboard = await db.get_dashboard(since, 5)
+    assert next(row for row in dashboard if row[0] == 'total')[3] == 4
+    assert [row[1] for row in dashboard if row[0] == 'giver'] == [1]
+
+    until = (today + timedelta(days=1)).strftime('%Y-%m-%d')
+    exported = [row async for chunk in db.iter_activity(CHAT, since, until, 3) for row in chunk]
+    assert len(exported) == 4 and len({row[0] for row in exported}) == 4
+    scores = [row async for chunk in db.iter_chat_scores(CHAT, 2) for row in chunk]
+    assert [row[0] for row in scores] == [11, 10, 12]
+
+    await db._executemany([('UPDATE users SET last_activity_month = ? WHERE chat_id = ?', [('2000-01', CHAT)])])
+    await db.reset_monthly_karma_if_needed()
+    assert await db.get_archived_top_users(CHAT, '2000-01', 1) == [(11, 5)]
+    assert await db.get_user_score(11, CHAT) == 0
+
+    await db._executemany([(
+        'INSERT INTO activity_log (chat_id, giver_id, receiver_id, score_change, timestamp) VALUES (?, ?, ?, ?, ?)',
+        db._activity_params([(CHAT, 1, 10, 1, '2000-01-02 03:04:05')])
+    )])
+    assert await db.compact_activity_log(30, 'archive') == 1
+
+    now = time.time()
+    await db.save_vote_marks([(CHAT, 1, 10, 100, now - 10), (CHAT, 1, 11, 101, now)])
+    await db.prune_vote_marks(now - 5)
+    assert len(await db.load_vote_marks(0)) == 1
+    await db.set_vote_policy(CHAT, 1.5, 10, 0)
+    assert [tuple(row) for row in await db.get_vote_policies()] == [(CHAT, 1.5, 10, 0)]
+
+    await db.set_fsm_state('smoke', 'AdminStates:waiting_for_user_id')
+    await db.set_fsm_data('smoke', json.dumps({'selected_chat_id': CHAT}))
+    assert await db.get_fsm('smoke') == ('AdminStates:waiting_for_user_id', json.dumps({'selected_chat_id': CHAT}))
+    assert len(await db.load_fsm()) == 1
+
+    await db.record_job_run('smoke', 123.0)
+    assert await db.get_job_runs() == {'smoke': 123.0}
+    assert await db.acquire_lease('scheduler', 'a', 30)
+    assert not await db.acquire_lease('scheduler', 'b', 30)
+
+    assert await db.reset_chats_scores([CHAT, OTHER_CHAT]) == 2
+    await db.delete_user(10, CHAT)
+    assert await db.count_users(CHAT) == 2
+
+
+async def run(args):
+    import asyncpg
+    from pg import PostgresDatabase
+
+    # Everything runs in a throwaway database, so the smoke test is safe against a shared server.
+    name = f"karma_smoke_{os.getpid()}"
+    admin = await asyncpg.connect(args.dsn)
+    await admin.execute(f'CREATE DATABASE {name}')
+    try:
+        db = PostgresDatabase(with_database(args.dsn, name), shared=True)
+        await db.open()
+        try:
+            await check_storage(db)
+        finally:
+            await db.close()
+    finally:
+        await admin.execute(f'DROP DATABASE {name}')
+        await admin.close()
+    print("PostgreSQL backend smoke test passed.")
+
+
+def main():
+    setup_logging(LOG_LEVEL, LOG_FORMAT)
+    parser = argparse.ArgumentParser(description="Exercise the PostgreSQL storage backend against a local server.")
+    parser.add_argument('--dsn', default=DATABASE_URL, help="Server to use; a temporary database is created on it")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
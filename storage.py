@@ -0,0 +1,573 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from leaderboard import ChatLeaderboard
+
+
+class Storage:
+    # Queries use '?' placeholders and SQL accepted by both SQLite and PostgreSQL;
+    # backends implement the primitives below plus schema and maintenance.
+
+    # Invalidation ids are taken at insert but become visible at commit, so on PostgreSQL a lower id
+    # can appear after a higher one; rows this recent are re-read on every sync and deduplicated by id.
+    SYNC_OVERLAP = 60
+
+    def __init__(self, flush_interval: float = 0.2, flush_max_rows: int = 500, shared: bool = False,
+                 sharded: bool = False):
+        self.flush_interval = flush_interval
+        self.flush_max_rows = flush_max_rows
+        self.shared = shared
+        # With updates sharded by chat (workers.py) no other process changes the scores of this process's chats.
+        self.sharded = sharded
+        self._sync_cursor = 0
+        self._synced = {}
+        self._pending_activity = []
+        self._pending_names = {}
+        self._flush_task = None
+        self._flush_writing = False
+        self._closing = False
+        self._admins = {}
+        self._chats = {}
+        self._chat_pages = {}
+        self._boards = {}
+
+    async def _create_schema(self):
+        raise NotImplementedError
+
+    async def _execute(self, query: str, params: tuple = ()) -> int:
+        raise NotImplementedError
+
+    async def _transaction_returning(self, statements):
+        # Runs the statements as one unit and returns the first row of the last one.
+        raise NotImplementedError
+
+    async def _fetchone(self, query: str, params: tuple = ()):
+        raise NotImplementedError
+
+    async def _fetchall(self, query: str, params: tuple = ()):
+        raise NotImplementedError
+
+    async def _fetchall_latest(self, query: str, params: tuple = ()):
+        return await self._fetchall(query, params)
+
+    async def _transaction(self, statements) -> list:
+        raise NotImplementedError
+
+    async def _executemany(self, batches):
+        raise NotImplementedError
+
+    async def _close_backend(self):
+        raise NotImplementedError
+
+    async def rebuild_daily_rollup(self) -> int:
+        raise NotImplementedError
+
+    async def compact_activity_log(self, retention_days: int, archive_dir: str, batch_size: int = 5000) -> int:
+        raise NotImplementedError
+
+    async def enable_incremental_vacuum(self) -> bool:
+        # Only SQLite needs a one-off conversion; PostgreSQL reclaims space with autovacuum.
+        return False
+
+    def _activity_params(self, rows):
+        return rows
+
+    async def open(self):
+        await self._create_schema()
+        self._admins.clear()
+        for user_id, chat_id in await self._fetchall_latest('SELECT user_id, chat_id FROM admins'):
+            self._admins.setdefault(chat_id, set()).add(user_id)
+        self._chats = {chat_id: (chat_name, chat_type)
+                       for chat_id, chat_name, chat_type in await self._fetchall_latest('SELECT chat_id, chat_name, chat_type FROM chats')}
+        if self.shared:
+            self._sync_cursor = (await self._fetchone('SELECT COALESCE(MAX(id), 0) FROM cache_invalidations'))[0]
+
+    async def close(self):
+        self._closing = True
+        task = self._flush_task
+        if task is not None and not task.done():
+            if self._flush_writing:
+                # A flush that is already writing owns the rows it took; cancelling it could drop them.
+                await asyncio.gather(task, return_exceptions=True)
+            else:
+                task.cancel()
+        await self.flush()
+        await self._close_backend()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        delay = self.flush_interval
+        while True:
+            await asyncio.sleep(delay)
+            self._flush_writing = True
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                if self._closing:
+                    # close() flushes once more itself and reports the failure.
+                    return
+                delay = min(delay * 2, 30)
+                logging.error("Error flushing pending writes, retrying in %.1fs: %s", delay, e)
+            finally:
+                self._flush_writing = False
+
+    async def flush(self):
+        rows, self._pending_activity = self._pending_activity, []
+        names, self._pending_names = self._pending_names, {}
+        batches = []
+        if rows:
+            batches.append((
+                'INSERT INTO activity_log (chat_id, giver_id, receiver_id, score_change, timestamp) VALUES (?, ?, ?, ?, ?)',
+                self._activity_params(rows)
+            ))
+            batches.extend(self._daily_rollup_batches(rows))
+        if names:
+            batches.append(('''
+                INSERT INTO user_names (user_id, full_name) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET full_name = excluded.full_name, updated_at = CURRENT_TIMESTAMP
+                WHERE user_names.full_name != excluded.full_name
+            ''', list(names.items())))
+        try:
+            await self._executemany(batches)
+        except Exception:
+            self._pending_activity[:0] = rows
+            self._pending_names = {**names, **self._pending_names}
+            raise
+
+    @staticmethod
+    def _daily_rollup_batches(rows):
+        days = {}
+        givers = set()
+        for chat_id, giver_id, _, score_change, timestamp in rows:
+            key = (chat_id, timestamp[:10])
+            plus_count, minus_count, net = days.get(key, (0, 0, 0))
+            days[key] = (plus_count + (score_change > 0), minus_count + (score_change < 0), net + score_change)
+            givers.add((*key, giver_id))
+
+        return [
+            ('''
+                INSERT INTO activity_daily (chat_id, day, plus_count, minus_count, net, givers)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(chat_id, day) DO UPDATE SET
+                    plus_count = activity_daily.plus_count + excluded.plus_count,
+                    minus_count = activity_daily.minus_count + excluded.minus_count,
+                    net = activity_daily.net + excluded.net
+            ''', [(*key, *totals) for key, totals in days.items()]),
+            ('INSERT INTO activity_daily_givers (chat_id, day, giver_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING',
+             list(givers)),
+            ('''
+                UPDATE activity_daily SET givers = (
+                    SELECT COUNT(*) FROM activity_daily_givers g WHERE g.chat_id = activity_daily.chat_id AND g.day = activity_daily.day
+                )
+                WHERE chat_id = ? AND day = ?
+            ''', list(days)),
+        ]
+
+    async def add_chat(self, chat_id: int, chat_name: str, chat_type: str):
+        if self._chats.get(chat_id) == (chat_name, chat_type):
+            return
+        await self._execute('''
+            INSERT INTO chats (chat_id, chat_name, chat_type) VALUES (?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET chat_name = excluded.chat_name, chat_type = excluded.chat_type
+        ''', (chat_id, chat_name, chat_type))
+        self._chats[chat_id] = (chat_name, chat_type)
+        self._chat_pages.clear()
+        await self._publish('chats', chat_id)
+        logging.info("Added/updated chat: %s (ID: %s)", chat_name, chat_id)
+
+    async def get_chats(self):
+        return [(chat_id, chat_name) for chat_id, (chat_name, _) in self._chats.items()]
+
+    async def get_chats_page(self, limit: int, after: int = None, before: int = None):
+        # Keyset pagination on chat_id; pages are cached until a chat is added or renamed.
+        key = (limit, after, before)
+        page = self._chat_pages.get(key)
+        if page is not None:
+            return page
+        if before is not None:
+            rows = await self._fetchall('SELECT chat_id, chat_name FROM chats WHERE chat_id < ? ORDER BY chat_id DESC LIMIT ?',
+                                        (before, limit + 1))
+            page = ([tuple(row) for row in reversed(rows[:limit])], len(rows) > limit, True)
+        else:
+            if after is None:
+                rows = await self._fetchall('SELECT chat_id, chat_name FROM chats ORDER BY chat_id LIMIT ?', (limit + 1,))
+            else:
+                rows = await self._fetchall('SELECT chat_id, chat_name FROM chats WHERE chat_id > ? ORDER BY chat_id LIMIT ?',
+                                            (after, limit + 1))
+            page = ([tuple(row) for row in rows[:limit]], after is not None, len(rows) > limit)
+        if len(self._chat_pages) >= 256:
+            self._chat_pages.clear()
+        self._chat_pages[key] = page
+        return page
+
+    async def search_chats(self, query: str, limit: int) -> list:
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        rows = await self._fetchall(
+            "SELECT chat_id, chat_name FROM chats WHERE LOWER(chat_name) LIKE LOWER(?) ESCAPE '\\' ORDER BY chat_name LIMIT ?",
+            (pattern, limit)
+        )
+        return [tuple(row) for row in rows]
+
+    async def _leaderboard(self, chat_id: int) -> ChatLeaderboard:
+        board = self._boards.get(chat_id)
+        if board is None:
+            rows = await self._fetchall_latest('SELECT user_id, score FROM users WHERE chat_id = ?', (chat_id,))
+            board = self._boards.setdefault(chat_id, ChatLeaderboard(rows))
+        return board
+
+    async def get_user_score(self, user_id: int, chat_id: int) -> int:
+        return (await self._leaderboard(chat_id)).score(user_id)
+
+    async def get_user_rank(self, user_id: int, chat_id: int):
+        board = await self._leaderboard(chat_id)
+        return board.rank(user_id), len(board)
+
+    async def count_users(self, chat_id: int) -> int:
+        return len(await self._leaderboard(chat_id))
+
+    async def update_user_score(self, user_id: int, chat_id: int, change: int) -> int:
+        current_month = datetime.now().strftime('%Y-%m')
+        # A vote can land before the monthly reset job runs; the previous month's score is
+        # archived here and the new month starts from this vote instead of adding to it.
+        row = await self._transaction_returning(self._score_invalidation(chat_id) + [
+            ('''
+                INSERT INTO monthly_scores (chat_id, month, user_id, score)
+                SELECT chat_id, last_activity_month, user_id, score FROM users
+                WHERE user_id = ? AND chat_id = ? AND last_activity_month < ? AND score != 0
+                ON CONFLICT(chat_id, month, user_id) DO UPDATE SET score = excluded.score
+            ''', (user_id, chat_id, current_month)),
+            ('''
+                INSERT INTO users (user_id, chat_id, score, last_activity_month)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, chat_id) DO UPDATE SET
+                    score = CASE WHEN users.last_activity_month < excluded.last_activity_month
+                                 THEN excluded.score ELSE users.score + excluded.score END,
+                    last_activity_month = excluded.last_activity_month
+                RETURNING score
+            ''', (user_id, chat_id, change, current_month)),
+        ])
+        score = row[0]
+        board = self._boards.get(chat_id)
+        if board is not None:
+            board.update(user_id, score)
+        return score
+
+    async def delete_user(self, user_id: int, chat_id: int):
+        await self._transaction(self._score_invalidation(chat_id) + [
+            ('DELETE FROM users WHERE user_id = ? AND chat_id = ?', (user_id, chat_id)),
+        ])
+        if chat_id in self._boards:
+            self._boards[chat_id].remove(user_id)
+
+    async def reset_chat_scores(self, chat_id: int):
+        await self._execute('UPDATE users SET score = 0 WHERE chat_id = ?', (chat_id,))
+        if chat_id in self._boards:
+            self._boards[chat_id].reset()
+        await self._publish('scores', chat_id)
+
+    async def reset_chats_scores(self, chat_ids) -> int:
+        chat_ids = list(dict.fromkeys(chat_ids))
+        await self._executemany([
+            ('UPDATE users SET score = 0 WHERE chat_id = ?', [(chat_id,) for chat_id in chat_ids]),
+            self._invalidations('scores', chat_ids),
+        ])
+        for chat_id in chat_ids:
+            if chat_id in self._boards:
+                self._boards[chat_id].reset()
+        return len(chat_ids)
+
+    def queue_user_name(self, user_id: int, full_name: str):
+        self._pending_names[user_id] = full_name
+        self._schedule_flush()
+
+    async def get_user_names(self, user_ids) -> dict:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        placeholders = ', '.join('?' * len(user_ids))
+        rows = await self._fetchall(f'SELECT user_id, full_name FROM user_names WHERE user_id IN ({placeholders})',
+                                    tuple(user_ids))
+        return {user_id: full_name for user_id, full_name in rows}
+
+    async def add_admin(self, user_id: int, chat_id: int):
+        await self._execute('INSERT INTO admins (user_id, chat_id) VALUES (?, ?) ON CONFLICT DO NOTHING', (user_id, chat_id))
+        self._admins.setdefault(chat_id, set()).add(user_id)
+        await self._publish('admins', chat_id)
+
+    async def remove_admin(self, user_id: int, chat_id: int):
+        await self._execute('DELETE FROM admins WHERE user_id = ? AND chat_id = ?', (user_id, chat_id))
+        self._admins.get(chat_id, set()).discard(user_id)
+        await self._publish('admins', chat_id)
+
+    async def add_admins(self, user_ids, chat_ids) -> int:
+        pairs = [(user_id, chat_id) for chat_id in dict.fromkeys(chat_ids) for user_id in dict.fromkeys(user_ids)]
+        added = sum(user_id not in self._admins.get(chat_id, ()) for user_id, chat_id in pairs)
+        await self._executemany([
+            ('INSERT INTO admins (user_id, chat_id) VALUES (?, ?) ON CONFLICT DO NOTHING', pairs),
+            self._invalidations('admins', dict.fromkeys(chat_id for _, chat_id in pairs)),
+        ])
+        for user_id, chat_id in pairs:
+            self._admins.setdefault(chat_id, set()).add(user_id)
+        return added
+
+    async def remove_admins(self, user_ids, chat_ids) -> int:
+        pairs = [(user_id, chat_id) for chat_id in dict.fromkeys(chat_ids) for user_id in dict.fromkeys(user_ids)]
+        removed = sum(user_id in self._admins.get(chat_id, ()) for user_id, chat_id in pairs)
+        await self._executemany([
+            ('DELETE FROM admins WHERE user_id = ? AND chat_id = ?', pairs),
+            self._invalidations('admins', dict.fromkeys(chat_id for _, chat_id in pairs)),
+        ])
+        for user_id, chat_id in pairs:
+            self._admins.get(chat_id, set()).discard(user_id)
+        return removed
+
+    async def is_admin(self, user_id: int, chat_id: int) -> bool:
+        return user_id in self._admins.get(chat_id, ())
+
+    async def get_chat_admins(self, chat_id: int) -> list:
+        return sorted(self._admins.get(chat_id, ()))
+
+    async def get_top_users(self, chat_id: int, limit: int = 10, offset: int = 0) -> list:
+        return (await self._leaderboard(chat_id)).top(limit, offset)
+
+    async def log_activity(self, chat_id: int, giver_id: int, receiver_id: int, score_change: int):
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self._pending_activity.append((chat_id, giver_id, receiver_id, score_change, timestamp))
+        if len(self._pending_activity) >= self.flush_max_rows:
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+    @staticmethod
+    def _month_bounds(year: int, month: int):
+        start_date = datetime(year, month, 1).strftime('%Y-%m-%d')
+        if month == 12:
+            end_date = datetime(year + 1, 1, 1).strftime('%Y-%m-%d')
+        else:
+            end_date = datetime(year, month + 1, 1).strftime('%Y-%m-%d')
+        return start_date, end_date
+
+    async def get_activity_version(self, chat_id: int, year: int, month: int):
+        row = await self._fetchone(
+            'SELECT SUM(plus_count + minus_count) FROM activity_daily WHERE chat_id = ? AND day >= ? AND day < ?',
+            (chat_id, *self._month_bounds(year, month))
+        )
+        return row[0]
+
+    async def get_monthly_activity(self, chat_id: int, year: int, month: int):
+        return await self._fetchall(
+            'SELECT day, net FROM activity_daily WHERE chat_id = ? AND day >= ? AND day < ? ORDER BY day',
+            (chat_id, *self._month_bounds(year, month))
+        )
+
+    async def reset_monthly_karma_if_needed(self):
+        current_month = datetime.now().strftime('%Y-%m')
+        _, archived = await self._transaction([
+            ('''
+                INSERT INTO monthly_scores (chat_id, month, user_id, score)
+                SELECT chat_id, last_activity_month, user_id, score FROM users
+                WHERE last_activity_month < ? AND score != 0
+                ON CONFLICT(chat_id, month, user_id) DO UPDATE SET score = excluded.score
+            ''', (current_month,)),
+            ('UPDATE users SET score = 0 WHERE last_activity_month < ? AND score != 0', (current_month,)),
+        ])
+        self._boards.clear()
+        await self._publish('scores')
+        if archived:
+            logging.info("Karma reset for new month: archived and cleared %s scores.", archived)
+
+    async def get_archived_top_users(self, chat_id: int, month: str, limit: int = 10, offset: int = 0) -> list:
+        return await self._fetchall(
+            'SELECT user_id, score FROM monthly_scores WHERE chat_id = ? AND month = ? ORDER BY score DESC, user_id LIMIT ? OFFSET ?',
+            (chat_id, month, limit, offset)
+        )
+
+    async def count_archived_users(self, chat_id: int, month: str) -> int:
+        row = await self._fetchone('SELECT COUNT(*) FROM monthly_scores WHERE chat_id = ? AND month = ?', (chat_id, month))
+        return row[0]
+
+    def _day_start(self, day: str):
+        return day
+
+    async def get_dashboard(self, since: str, top_limit: int = 10) -> list:
+        # One round trip: overall totals, per-day vote counts and the top givers across every chat.
+        # NULL placeholders are cast because PostgreSQL types UNION branches pairwise.
+        return await self._fetchall('''
+            WITH recent AS (
+                SELECT chat_id, giver_id, receiver_id FROM activity_log WHERE timestamp >= ?
+            ),
+            top_givers AS (
+                SELECT giver_id, COUNT(*) AS votes, COUNT(DISTINCT chat_id) AS chats FROM recent
+                GROUP BY giver_id ORDER BY votes DESC, giver_id LIMIT ?
+            )
+            SELECT 'total', CAST(NULL AS BIGINT), CAST(NULL AS TEXT), COUNT(*), COUNT(DISTINCT chat_id),
+                   (SELECT COUNT(*) FROM (SELECT giver_id FROM recent UNION SELECT receiver_id FROM recent) AS participants)
+            FROM recent
+            UNION ALL
+            SELECT 'day', CAST(NULL AS BIGINT), day, SUM(plus_count + minus_count), COUNT(*), SUM(givers)
+            FROM activity_daily WHERE day >= ? GROUP BY day
+            UNION ALL
+            SELECT 'giver', giver_id, CAST(NULL AS TEXT), votes, chats, CAST(NULL AS BIGINT) FROM top_givers
+        ''', (self._day_start(since), top_limit, since))
+
+    async def iter_chat_scores(self, chat_id: int, chunk_size: int):
+        query = '''
+            SELECT u.user_id, n.full_name, u.score, u.last_activity_month
+            FROM users u LEFT JOIN user_names n ON n.user_id = u.user_id
+            WHERE u.chat_id = ? {}
+            ORDER BY u.score DESC, u.user_id LIMIT ?
+        '''
+        rows = await self._fetchall(query.format(''), (chat_id, chunk_size))
+        while rows:
+            yield rows
+            if len(rows) < chunk_size:
+                break
+            user_id, _, score, _ = rows[-1]
+            rows = await self._fetchall(query.format('AND (u.score < ? OR (u.score = ? AND u.user_id > ?))'),
+                                        (chat_id, score, score, user_id, chunk_size))
+
+    async def iter_activity(self, chat_id: int, since: str, until: str, chunk_size: int):
+        # Keyset pagination along idx_activity_log_chat_time: each chunk is one short indexed read, never OFFSET.
+        query = '''
+            SELECT id, timestamp, giver_id, receiver_id, score_change FROM activity_log
+            WHERE chat_id = ? AND timestamp >= ? AND timestamp < ? AND (timestamp > ? OR id > ?)
+            ORDER BY timestamp, id LIMIT ?
+        '''
+        last_timestamp, last_id, until = self._day_start(since), 0, self._day_start(until)
+        while True:
+            rows = await self._fetchall(query, (chat_id, last_timestamp, until, last_timestamp, last_id, chunk_size))
+            if not rows:
+                break
+            yield rows
+            if len(rows) < chunk_size:
+                break
+            last_id, last_timestamp = rows[-1][0], rows[-1][1]
+
+    async def _publish(self, scope: str, chat_id: int = None):
+        if self.shared:
+            await self._execute('INSERT INTO cache_invalidations (scope, chat_id, created_at) VALUES (?, ?, ?)',
+                                (scope, chat_id, time.time()))
+
+    def _score_invalidation(self, chat_id: int) -> list:
+        # Replicas behind a load balancer may each hold this chat's leaderboard, so single score changes
+        # are broadcast too; the writing replica also drops its own copy on the next sync.
+        if not self.shared or self.sharded:
+            return []
+        return [('INSERT INTO cache_invalidations (scope, chat_id, created_at) VALUES (?, ?, ?)',
+                 ('scores', chat_id, time.time()))]
+
+    def _invalidations(self, scope: str, chat_ids):
+        # Batch form of _publish, so bulk writes and their invalidations commit together.
+        now = time.time()
+        rows = [(scope, chat_id, now) for chat_id in chat_ids] if self.shared else []
+        return 'INSERT INTO cache_invalidations (scope, chat_id, created_at) VALUES (?, ?, ?)', rows
+
+    async def sync_shared_state(self):
+        horizon = time.time() - self.SYNC_OVERLAP
+        rows = await self._fetchall('''
+            SELECT id, scope, chat_id, created_at FROM cache_invalidations
+            WHERE id > ? OR created_at >= ? ORDER BY id
+        ''', (self._sync_cursor, horizon))
+        rows = [row for row in rows if row[0] not in self._synced]
+        self._synced = {row_id: created_at for row_id, created_at in self._synced.items() if created_at >= horizon}
+        for row_id, scope, chat_id, created_at in rows:
+            self._synced[row_id] = created_at
+            if scope == 'admins':
+                admin_rows = await self._fetchall('SELECT user_id FROM admins WHERE chat_id = ?', (chat_id,))
+                self._admins[chat_id] = {row[0] for row in admin_rows}
+            elif scope == 'chats':
+                row = await self._fetchone('SELECT chat_name, chat_type FROM chats WHERE chat_id = ?', (chat_id,))
+                if row:
+                    self._chats[chat_id] = tuple(row)
+                self._chat_pages.clear()
+            elif scope == 'scores':
+                if chat_id is None:
+                    self._boards.clear()
+                else:
+                    self._boards.pop(chat_id, None)
+        if rows:
+            self._sync_cursor = max(self._sync_cursor, rows[-1][0])
+
+    async def prune_invalidations(self, max_age: float = 3600):
+        await self._execute('DELETE FROM cache_invalidations WHERE created_at < ?', (time.time() - max_age,))
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        return await self._execute('''
+            INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+        ''', (name, owner, now + ttl, now)) == 1
+
+    async def save_vote_marks(self, rows):
+        await self._executemany([(
+            'INSERT INTO vote_marks (chat_id, giver_id, receiver_id, message_id, voted_at) VALUES (?, ?, ?, ?, ?)',
+            rows
+        )])
+
+    async def load_vote_marks(self, since: float) -> list:
+        return await self._fetchall('''
+            SELECT chat_id, giver_id, receiver_id, message_id, voted_at FROM vote_marks
+            WHERE voted_at >= ? ORDER BY voted_at
+        ''', (since,))
+
+    async def prune_vote_marks(self, before: float):
+        await self._execute('DELETE FROM vote_marks WHERE voted_at < ?', (before,))
+
+    async def get_vote_policies(self) -> list:
+        return await self._fetchall('SELECT chat_id, giver_cooldown, receiver_cooldown, daily_cap FROM vote_policies')
+
+    async def set_vote_policy(self, chat_id: int, giver_cooldown: float, receiver_cooldown: float, daily_cap: int):
+        await self._execute('''
+            INSERT INTO vote_policies (chat_id, giver_cooldown, receiver_cooldown, daily_cap) VALUES (?, ?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET giver_cooldown = excluded.giver_cooldown,
+                receiver_cooldown = excluded.receiver_cooldown, daily_cap = excluded.daily_cap
+        ''', (chat_id, giver_cooldown, receiver_cooldown, daily_cap))
+
+    async def get_job_runs(self) -> dict:
+        return dict(await self._fetchall('SELECT name, last_run_at FROM job_runs'))
+
+    async def record_job_run(self, name: str, run_at: float):
+        await self._execute('''
+            INSERT INTO job_runs (name, last_run_at) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET last_run_at = excluded.last_run_at
+        ''', (name, run_at))
+
+    async def load_fsm(self) -> list:
+        return await self._fetchall('SELECT key, state, data FROM fsm_state')
+
+    async def get_fsm(self, key: str):
+        row = await self._fetchone('SELECT state, data FROM fsm_state WHERE key = ?', (key,))
+        return tuple(row) if row else (None, None)
+
+    async def set_fsm_state(self, key: str, state):
+        await self._save_fsm(key, 'state', state)
+
+    async def set_fsm_data(self, key: str, data: str):
+        await self._save_fsm(key, 'data', data)
+
+    async def _save_fsm(self, key: str, column: str, value):
+        await self._transaction([
+            (f'''
+                INSERT INTO fsm_state (key, {column}) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}
+            ''', (key, value)),
+            ("DELETE FROM fsm_state WHERE key = ? AND state IS NULL AND COALESCE(data, '{}') = '{}'", (key,)),
+        ])
+
+
+def create_database(backend: str, *, sqlite_path: str = None, read_workers: int = 4, busy_timeout: float = 5.0,
+                    sqlite_pragmas: dict = None, postgres_dsn: str = None, pool_min_size: int = 2, pool_max_size: int = 10, **options) -> Storage:
+    if backend == 'postgres':
+        from pg import PostgresDatabase
+        return PostgresDatabase(postgres_dsn, min_size=pool_min_size, max_size=pool_max_size, **options)
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown database backend: {backend}")
+    from db import Database
+    return Database(sqlite_path, read_workers=read_workers, busy_timeout=busy_timeout, pragmas=sqlite_pragmas, **options)
@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import OrderedDict, deque
+
+
+class VotePolicy:
+    def __init__(self, giver_cooldown: float = 0, receiver_cooldown: float = 0, daily_cap: int = 0):
+        self.giver_cooldown = giver_cooldown
+        self.receiver_cooldown = receiver_cooldown
+        self.daily_cap = daily_cap
+
+
+class VoteThrottle:
+    # Every structure is ordered by last use, so expired entries are always at the front
+    # and each vote costs O(1) amortized work no matter how much state is held.
+    WINDOW = 86400
+
+    def __init__(self, db, default_policy: VotePolicy, capacity: int = 100000):
+        self.db = db
+        self.default_policy = default_policy
+        self.capacity = capacity
+        self.policies = {}
+        self._messages = OrderedDict()
+        self._givers = OrderedDict()
+        self._pairs = OrderedDict()
+        self._daily = OrderedDict()
+        self._unsaved = []
+
+    def policy(self, chat_id: int) -> VotePolicy:
+        return self.policies.get(chat_id, self.default_policy)
+
+    def _touch(self, entries: OrderedDict, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def _expire(self, now: float):
+        horizon = now - self.WINDOW
+        for entries in (self._messages, self._givers, self._pairs):
+            while entries and next(iter(entries.values())) < horizon:
+                entries.popitem(last=False)
+        while self._daily and next(iter(self._daily.values()))[-1] < horizon:
+            self._daily.popitem(last=False)
+
+    def check(self, chat_id: int, message_id: int, giver_id: int, receiver_id: int, now: float = None):
+        now = time.time() if now is None else now
+        self._expire(now)
+        policy = self.policy(chat_id)
+        if (chat_id, message_id, giver_id) in self._messages:
+            return 'duplicate'
+        last = self._givers.get((chat_id, giver_id))
+        if last is not None and now - last < policy.giver_cooldown:
+            return 'giver_cooldown'
+        last = self._pairs.get((chat_id, giver_id, receiver_id))
+        if last is not None and now - last < policy.receiver_cooldown:
+            return 'receiver_cooldown'
+        votes = self._daily.get((chat_id, giver_id))
+        if policy.daily_cap and votes:
+            while votes and votes[0] < now - self.WINDOW:
+                votes.popleft()
+            if len(votes) >= policy.daily_cap:
+                return 'daily_cap'
+        return None
+
+    def _record(self, chat_id: int, message_id: int, giver_id: int, receiver_id: int, now: float):
+        self._touch(self._messages, (chat_id, message_id, giver_id), now)
+        self._touch(self._givers, (chat_id, giver_id), now)
+        self._touch(self._pairs, (chat_id, giver_id, receiver_id), now)
+        cap = self.policy(chat_id).daily_cap
+        if cap:
+            votes = self._daily.get((chat_id, giver_id))
+            if votes is None or votes.maxlen != cap:
+                votes = deque(votes or (), maxlen=cap)
+            votes.append(now)
+            self._touch(self._daily, (chat_id, giver_id), votes)
+
+    def acquire(self, chat_id: int, message_id: int, giver_id: int, receiver_id: int, now: float = None):
+        # Check and record happen without yielding to the loop, so concurrent duplicates cannot both pass.
+        now = time.time() if now is None else now
+        reason = self.check(chat_id, message_id, giver_id, receiver_id, now)
+        if reason is None:
+            self._record(chat_id, message_id, giver_id, receiver_id, now)
+            self._unsaved.append((chat_id, giver_id, receiver_id, message_id, now))
+        return reason
+
+    async def load(self):
+        await self.load_policies()
+        rows = await self.db.load_vote_marks(time.time() - self.WINDOW)
+        for chat_id, giver_id, receiver_id, message_id, voted_at in rows:
+            self._record(chat_id, message_id, giver_id, receiver_id, voted_at)
+        logging.info("Vote throttle restored %s recent votes.", len(rows))
+
+    async def load_policies(self):
+        self.policies = {
+            chat_id: VotePolicy(giver_cooldown, receiver_cooldown, daily_cap)
+            for chat_id, giver_cooldown, receiver_cooldown, daily_cap in await self.db.get_vote_policies()
+        }
+
+    async def persist(self):
+        rows, self._unsaved = self._unsaved, []
+        try:
+            if rows:
+                await self.db.save_vote_marks(rows)
+            await self.db.prune_vote_marks(time.time() - self.WINDOW)
+        except Exception as e:
+            logging.error("Error persisting vote throttle state: %s", e)
+            self._unsaved = rows + self._unsaved
+            return
+        await self.load_policies()
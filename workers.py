@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import queue as queue_module
+import signal
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import (BOT_TOKEN, WORKERS, WORKER_PENDING_UPDATES, WORKER_ID, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH,
+                    WEBHOOK_SECRET, LOG_LEVEL, LOG_FORMAT, METRICS_PORT)
+from logs import setup_logging
+
+# Update types handled in main.py; the front process does not import the bot itself.
+ALLOWED_UPDATES = ['message', 'callback_query', 'chat_member']
+
+
+def update_chat_id(update: dict) -> int:
+    for key, event in update.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        chat = event.get('chat') or (event.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        user = event.get('from') or event.get('user')
+        if user:
+            return user['id']
+    return 0
+
+
+class ChatQueues:
+    # Updates of one chat are handled in arrival order; different chats are handled concurrently.
+    def __init__(self, handle, limit: int):
+        self.handle = handle
+        self.queues = {}
+        self.tasks = set()
+        self.pending = asyncio.Semaphore(limit)
+
+    async def put(self, chat_id: int, update: dict):
+        await self.pending.acquire()
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = self.queues[chat_id] = collections.deque()
+            task = asyncio.create_task(self._drain(chat_id, queue))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        queue.append(update)
+
+    async def _drain(self, chat_id: int, queue: collections.deque):
+        while queue:
+            update = queue.popleft()
+            try:
+                await self.handle(update)
+            except Exception:
+                logging.exception("Error processing update in worker %s", os.environ['WORKER_ID'])
+            finally:
+                self.pending.release()
+        del self.queues[chat_id]
+
+    async def join(self):
+        while self.tasks:
+            await asyncio.gather(*self.tasks)
+
+
+def worker_main(queue, fake_bot: bool):
+    # The front process stops workers through their queues. SIGTERM sent to a worker directly
+    # (e.g. to the whole process group) finishes the queued updates and shuts the dispatcher down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    asyncio.run(consume(queue, fake_bot, stopping))
+
+
+def next_update(queue, stopping):
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except queue_module.Empty:
+            if stopping.is_set():
+                return None
+
+
+async def consume(queue, fake_bot: bool, stopping: threading.Event):
+    import main
+
+    if fake_bot:
+        from bench import install_fake_session
+        install_fake_session(main.bot)
+
+    loop = asyncio.get_running_loop()
+    chats = ChatQueues(lambda update: main.dp.feed_raw_update(main.bot, update), WORKER_PENDING_UPDATES)
+    await main.dp.emit_startup()
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, next_update, queue, stopping)
+            if raw is None:
+                break
+            update = json.loads(raw)
+            await chats.put(update_chat_id(update), update)
+        await chats.join()
+    finally:
+        await main.dp.emit_shutdown()
+        await main.bot.session.close()
+
+
+class Sharder:
+    # A worker that stops taking updates for this long is treated as stuck.
+    DISPATCH_TIMEOUT = 10
+    # A worker dying again this soon after a restart is crash-looping; restarting it would not help.
+    MIN_UPTIME = 60
+
+    def __init__(self, workers: int, fake_bot: bool = False):
+        self.context = multiprocessing.get_context('spawn')
+        self.fake_bot = fake_bot
+        self.queues = [self.context.Queue(maxsize=10000) for _ in range(workers)]
+        self.processes = [None] * workers
+        self.started = [0.0] * workers
+
+    def _spawn(self, i: int):
+        # Spawned workers read config from the environment they inherit at start.
+        os.environ['WORKER_ID'] = f"{WORKER_ID}-{i}"
+        if METRICS_PORT:
+            os.environ['METRICS_PORT'] = str(METRICS_PORT + 1 + i)
+        process = self.context.Process(target=worker_main, args=(self.queues[i], self.fake_bot),
+                                       name=f"karma-worker-{i}")
+        process.start()
+        self.processes[i] = process
+        self.started[i] = time.monotonic()
+
+    def start(self):
+        os.environ['SHARED_STATE'] = '1'
+        os.environ['BOT_MODE'] = 'worker'
+        for i in range(len(self.queues)):
+            self._spawn(i)
+
+    def dispatch(self, update: dict):
+        i = update_chat_id(update) % len(self.queues)
+        process = self.processes[i]
+        if not process.is_alive():
+            if time.monotonic() - self.started[i] < self.MIN_UPTIME:
+                raise RuntimeError(f"Worker {i} keeps exiting (last exit code {process.exitcode})")
+            # A killed worker may still hold its queue's read lock, so the replacement gets a new queue;
+            # updates left in the old one are lost.
+            logging.error("Worker %s exited with code %s, restarting it; %s queued updates dropped.",
+                          i, process.exitcode, self.queues[i].qsize())
+            self.queues[i] = self.context.Queue(maxsize=10000)
+            self._spawn(i)
+        try:
+            self.queues[i].put(json.dumps(update), timeout=self.DISPATCH_TIMEOUT)
+        except queue_module.Full:
+            raise RuntimeError(f"Worker {i} has not taken an update for {self.DISPATCH_TIMEOUT}s") from None
+
+    def stop(self):
+        for queue, process in zip(self.queues, self.processes):
+            if process.is_alive():
+                queue.put(None)
+        for process in self.processes:
+            process.join()
+
+
+async def run_polling(sharder: Sharder):
+    from aiogram import Bot
+    from aiogram.dispatcher.dispatcher import DEFAULT_BACKOFF_CONFIG
+    from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+    from aiogram.utils.backoff import Backoff
+
+    bot = Bot(token=BOT_TOKEN)
+    # Same retry policy as aiogram's own polling: a Telegram outage must not stop the workers.
+    backoff = Backoff(config=DEFAULT_BACKOFF_CONFIG)
+    offset = None
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=ALLOWED_UPDATES)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logging.error("Failed to fetch updates: %s. Retrying in %.1fs (attempt %s).",
+                              e, backoff.next_delay, backoff.counter + 1)
+                await backoff.asleep()
+                continue
+            backoff.reset()
+            for update in updates:
+                sharder.dispatch(update.model_dump(mode='json', exclude_none=True))
+                offset = update.update_id + 1
+    finally:
+        await bot.session.close()
+
+
+def run_webhook(sharder: Sharder):
+    from aiohttp import web
+
+    async def receive(request):
+        if request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        sharder.dispatch(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+
+
+def run_replay(sharder: Sharder, path: str):
+    started = time.perf_counter()
+    count = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                sharder.dispatch(json.loads(line))
+                count += 1
+    sharder.stop()
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {count} updates across {len(sharder.queues)} workers in {elapsed:.2f}s ({count / elapsed:.0f} updates/sec).")
+
+
+def main():
+    setup_logging(LOG_LEVEL, LOG_FORMAT, '%(asctime)s - %(levelname)s - %(processName)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Run the bot as several worker processes sharded by chat_id.")
+    parser.add_argument('source', choices=['polling', 'webhook', 'replay'])
+    parser.add_argument('file', nargs='?', help="Recorded updates, one JSON object per line (replay only)")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--fake-bot', action='store_true', help="Answer Bot API calls locally instead of calling Telegram")
+    args = parser.parse_args()
+    if args.source == 'replay' and not args.file:
+        parser.error("replay needs a file of recorded updates")
+    if args.source == 'webhook' and not WEBHOOK_SECRET:
+        parser.error("webhook mode needs WEBHOOK_SECRET; without it anyone can post forged updates")
+
+    # SIGTERM stops the update source like Ctrl+C does; workers then drain their queues and shut down.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    sharder = Sharder(args.workers, fake_bot=args.fake_bot)
+    sharder.start()
+    try:
+        if args.source == 'replay':
+            run_replay(sharder, args.file)
+        elif args.source == 'polling':
+            asyncio.run(run_polling(sharder))
+        else:
+            run_webhook(sharder)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sharder.stop()
+
+
+if __name__ == "__main__":
+    main()